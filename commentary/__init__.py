@@ -1,9 +1,12 @@
 from importlib import import_module
+from urllib.parse import quote
 
-from django.apps import apps
+from django.apps import apps as django_apps
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.urls import reverse
+from django.core.signals import setting_changed
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.http import RFC3986_SUBDELIMS
 from django.utils.module_loading import import_string
 
 
@@ -15,20 +18,34 @@ COMMENTS_TIMEOUT = _get_setting('TIMEOUT', 360)  # 1h
 COMMENTS_ALLOW_HTML = _get_setting('ALLOW_HTML', False)
 COMMENTS_HIDE_REMOVED = _get_setting('HIDE_REMOVED', True)
 COMMENTS_WIDGET = _get_setting('WIDGET', 'django.forms.Textarea')
+COMMENTS_USE_COUNTERS = _get_setting('USE_COUNTERS', False)
+COMMENTS_CACHE = _get_setting('CACHE', None)
+COMMENTS_USE_ROWS = _get_setting('USE_ROWS', False)
+COMMENTS_USE_OUTBOX = _get_setting('USE_OUTBOX', False)
 
 if isinstance(COMMENTS_WIDGET, str):
     COMMENTS_WIDGET = import_string(COMMENTS_WIDGET)
 
 DEFAULT_COMMENTS_APP = 'commentary'
 
+default_app_config = 'commentary.apps.CommentaryConfig'
+
+# The resolved comment app and its hooks, cached on first use.
+_comment_app = []
+_hooks = {}
+
 
 def get_comment_app():
     """
     Get the comment app (i.e. "commentary") as defined in the settings
     """
+    try:
+        return _comment_app[0]
+    except IndexError:
+        pass
     # Make sure the app's in INSTALLED_APPS
     comments_app = _get_setting('APP', DEFAULT_COMMENTS_APP)
-    if not apps.is_installed(comments_app):
+    if not django_apps.is_installed(comments_app):
         raise ImproperlyConfigured(
             'The COMMENTS_APP (%r) must be in INSTALLED_APPS' % comments_app
         )
@@ -41,20 +58,90 @@ def get_comment_app():
             'to a non-existent package. (%s)' % e
         )
 
+    _comment_app.append(package)
     return package
 
 
-def _check_attr(attr):
-    app = get_comment_app()
-    return app.__name__ != DEFAULT_COMMENTS_APP and hasattr(app, attr)
+def _get_hook(attr):
+    """
+    Get a hook function of a custom comment app,
+    or ``None`` if the app doesn't define it.
+    """
+    try:
+        return _hooks[attr]
+    except KeyError:
+        app = get_comment_app()
+        hook = None
+        if app.__name__ != DEFAULT_COMMENTS_APP:
+            hook = getattr(app, attr, None)
+        _hooks[attr] = hook
+        return hook
+
+
+def reset_comment_app(**kwargs):
+    """
+    Clear the cached comment app and hooks. This is called automatically
+    when the ``COMMENTS_APP`` or ``INSTALLED_APPS`` settings are changed.
+    """
+    setting = kwargs.get('setting')
+    if setting is None or setting in ('COMMENTS_APP', 'INSTALLED_APPS'):
+        del _comment_app[:]
+        _hooks.clear()
+
+
+setting_changed.connect(reset_comment_app)
+
+
+# Placeholder arguments used to turn URL patterns into format strings.
+_URL_PLACEHOLDERS = ('918273645', '918273646')
+_url_templates = {}
+
+
+def _get_url_template(viewname, nargs):
+    """
+    Resolve the URL of a view once per URLconf and script prefix,
+    and return it as a format string, or ``None`` if that's not possible.
+    """
+    key = (
+        get_urlconf() or settings.ROOT_URLCONF,
+        get_script_prefix(), viewname, nargs
+    )
+    try:
+        return _url_templates[key]
+    except KeyError:
+        placeholders = _URL_PLACEHOLDERS[:nargs]
+        template = reverse(viewname, args=placeholders).replace('%', '%%')
+        for index, placeholder in enumerate(placeholders):
+            if template.count(placeholder) != 1:
+                template = None
+                break
+            template = template.replace(placeholder, '%%(%d)s' % index)
+        _url_templates[key] = template
+        return template
+
+
+def reverse_comment_url(viewname, *args):
+    """
+    Like ``reverse(viewname, args=args)``, but build
+    the URL from a template that is resolved only once.
+    """
+    template = _get_url_template(viewname, len(args))
+    if template is None:
+        return reverse(viewname, args=args)
+    safe = RFC3986_SUBDELIMS + '/~:@'
+    return template % {
+        str(index): quote(str(arg), safe=safe)
+        for index, arg in enumerate(args)
+    }
 
 
 def get_model():
     """
     Returns the comment model class.
     """
-    if _check_attr('get_model'):
-        return get_comment_app().get_model()
+    hook = _get_hook('get_model')
+    if hook is not None:
+        return hook()
     else:
         from commentary.models import Comment
         return Comment
@@ -65,8 +152,9 @@ def get_form():
     """
     Returns the comment ModelForm class.
     """
-    if _check_attr('get_form'):
-        return get_comment_app().get_form()
+    hook = _get_hook('get_form')
+    if hook is not None:
+        return hook()
     else:
         return CommentForm
 
@@ -75,8 +163,9 @@ def get_form_target():
     """
     Returns the target URL for the comment form submission view.
     """
-    if _check_attr('get_form_target'):
-        return get_comment_app().get_form_target()
+    hook = _get_hook('get_form_target')
+    if hook is not None:
+        return hook()
     else:
         return reverse('comments-post-comment')
 
@@ -85,35 +174,69 @@ def get_flag_url(comment):
     """
     Get the URL for the "flag this comment" view.
     """
-    if _check_attr('get_flag_url'):
-        return get_comment_app().get_flag_url(comment)
+    hook = _get_hook('get_flag_url')
+    if hook is not None:
+        return hook(comment)
     else:
-        return reverse('comments-flag', args=(comment.id,))
+        return reverse_comment_url('comments-flag', comment.id)
 
 
 def get_delete_url(comment):
     """
     Get the URL for the "delete this comment" view.
     """
-    if _check_attr('get_delete_url'):
-        return get_comment_app().get_delete_url(comment)
+    hook = _get_hook('get_delete_url')
+    if hook is not None:
+        return hook(comment)
     else:
-        return reverse('comments-delete', args=(comment.id,))
+        return reverse_comment_url('comments-delete', comment.id)
 
 
 def get_approve_url(comment):
     """
     Get the URL for the "approve this comment from moderation" view.
     """
-    if _check_attr('get_approve_url'):
-        return get_comment_app().get_approve_url(comment)
+    hook = _get_hook('get_approve_url')
+    if hook is not None:
+        return hook(comment)
     else:
-        return reverse('comments-approve', args=(comment.id,))
+        return reverse_comment_url('comments-approve', comment.id)
 
 
 def get_user_display(user):
     """Get the full name or username to display for a user."""
-    if _check_attr('get_user_display'):
-        return get_comment_app().get_user_display(user)
+    hook = _get_hook('get_user_display')
+    if hook is not None:
+        return hook(user)
     else:
         return user.get_full_name() or user.get_username()
+
+
+def get_user_displays(users):
+    """
+    Get the full names or usernames to display for many users
+    at once, as a dictionary keyed by their primary keys.
+    """
+    hook = _get_hook('get_user_displays')
+    if hook is not None:
+        return hook(users)
+    else:
+        return {user.pk: get_user_display(user) for user in users}
+
+
+def attach_user_displays(comments):
+    """
+    Resolve the display names of the users of some comments
+    with a single call to ``get_user_displays``, and attach them
+    to the comments. The users should already be fetched.
+    """
+    users = {c.user_id: c.user for c in comments if c.user_id is not None}
+    displays = get_user_displays(users.values()) if users else {}
+    if any(c.user_id is None for c in comments):
+        # A custom ``get_user_display`` also displays the comments
+        # without a user, such as the anonymous ones.
+        hook = _get_hook('get_user_display')
+        displays[None] = hook(None) if hook is not None else ''
+    for comment in comments:
+        comment.user_display = displays[comment.user_id]
+    return comments
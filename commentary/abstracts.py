@@ -1,19 +1,65 @@
+import re
+from hashlib import md5
+
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.core.validators import int_list_validator
-from django.db import models, transaction
-from django.urls import reverse
-from django.utils.html import strip_tags
-from django.utils.functional import cached_property
+from django.core.validators import RegexValidator
+from django.db import connections, models, router, transaction
+from django.db.models import Subquery, Value
+from django.db.models.functions import Concat
+from django.utils.html import linebreaks, strip_tags
 from django.utils.translation import gettext_lazy as _
 
-from . import COMMENTS_ALLOW_HTML, get_user_display
+from . import COMMENTS_ALLOW_HTML, get_user_display, reverse_comment_url
 from .managers import CommentManager
 
 
-tree_path_validator = int_list_validator('/', 'Invalid comment tree path')
+#: The number of base-36 digits in each node of a tree path.
+NODE_WIDTH = 7
+
+_NODE_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+tree_path_validator = RegexValidator(
+    re.compile(r'^[0-9a-z]{%d}(?:/[0-9a-z]{%d})*\Z' % (
+        NODE_WIDTH, NODE_WIDTH
+    )),
+    message='Invalid comment tree path', code='invalid'
+)
+
+
+def encode_node(pk):
+    """
+    Encode a primary key as a fixed-width, zero-padded base-36 tree path node,
+    so that sorting paths lexicographically also sorts them numerically.
+    """
+    node, value = '', int(pk)
+    if value < 0:
+        raise ValueError('Cannot encode negative id %s' % pk)
+    while value:
+        value, digit = divmod(value, 36)
+        node = _NODE_DIGITS[digit] + node
+    if len(node) > NODE_WIDTH:
+        raise ValueError('Id %s does not fit in a tree path node' % pk)
+    return node.rjust(NODE_WIDTH, '0')
+
+
+def decode_node(node):
+    """Decode a tree path node back into a primary key."""
+    return int(node, 36)
+
+
+def make_digest(body, user_id, content_type_id, object_pk):
+    """
+    Hash the body of a comment, with its whitespace normalized,
+    along with its user and the object it's attached to.
+    """
+    value = '\0'.join((
+        ' '.join(body.split()), str(user_id or ''),
+        str(content_type_id), str(object_pk)
+    ))
+    return md5(value.encode()).hexdigest()
 
 
 class BaseCommentAbstractModel(models.Model):
@@ -33,6 +79,12 @@ class BaseCommentAbstractModel(models.Model):
 
     # Comment content
     body = models.TextField(_('comment'), db_column='comment')
+    body_html = models.TextField(
+        _('rendered comment'), null=True, editable=False
+    )
+    body_text = models.TextField(
+        _('comment text'), null=True, editable=False
+    )
 
     # Metadata about the comment
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
@@ -65,17 +117,55 @@ class BaseCommentAbstractModel(models.Model):
         """Check whether this comment has been edited."""
         return self.submit_date != self.edit_date
 
-    @cached_property
-    def _date(self):
-        return self.submit_date.date()
+    def mark_removed(self):
+        """
+        Mark the comment as removed, updating only ``is_removed``.
+        Returns whether it changed.
+        """
+        return self._set_state(is_removed=True)
+
+    def mark_approved(self):
+        """
+        Mark the comment as public and not removed, updating only the
+        fields that changed. Returns whether any of them changed.
+        """
+        return self._set_state(is_public=True, is_removed=False)
+
+    def _set_state(self, **values):
+        changed = [f for f, v in values.items() if getattr(self, f) != v]
+        for field in changed:
+            setattr(self, field, values[field])
+        if changed:
+            self.save(update_fields=changed)
+        return bool(changed)
+
+    def render_body(self):
+        """
+        Render the body of the comment to ``body_html``, and to
+        ``body_text`` as well if ``COMMENTS_ALLOW_HTML`` is True.
+        """
+        if COMMENTS_ALLOW_HTML:
+            self.body_html = linebreaks(self.body)
+            self.body_text = strip_tags(self.body)
+        else:
+            self.body_html = linebreaks(self.body, autoescape=True)
+            self.body_text = None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'body' in update_fields:
+            self.render_body()
+            if update_fields is not None:
+                kwargs['update_fields'] = \
+                    set(update_fields) | {'body_html', 'body_text'}
+        super(BaseCommentAbstractModel, self).save(*args, **kwargs)
 
     def get_content_object_url(self):
         """
         Get a URL suitable for redirecting to the content object.
         """
-        return reverse(
-            'comments-url-redirect',
-            args=(self.content_type_id, self.object_pk)
+        return reverse_comment_url(
+            'comments-url-redirect', self.content_type_id, self.object_pk
         )
 
     def get_absolute_url(self, anchor_pattern='#c%(id)s'):
@@ -96,26 +186,64 @@ class AbstractTreeModel(models.Model):
         'self', verbose_name='last child', blank=True,
         null=True, on_delete=models.SET_NULL
     )
+    depth = models.PositiveSmallIntegerField(
+        'tree depth', default=1, editable=False, db_index=True
+    )
+    root = models.ForeignKey(
+        'self', verbose_name='tree root', related_name='+', blank=True,
+        null=True, editable=False, on_delete=models.CASCADE
+    )
+
+    def _reserve_pk(self, using):
+        """
+        Reserve the primary key of a new node from its sequence so that the
+        node can be inserted with its final path. Returns ``None`` on database
+        backends that don't use sequences.
+        """
+        connection = connections[using]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s))', (
+                self._meta.db_table, self._meta.pk.column
+            ))
+            return cursor.fetchone()[0]
+
+    def _tree_fields(self, subquery=False):
+        """
+        Get the path, depth and root id of the node. If ``subquery`` is
+        ``True`` and the parent isn't loaded, they are returned as expressions
+        that read the fields of the parent instead of fetching it.
+        """
+        node = encode_node(self.pk)
+        if self.parent_id is None:
+            return node, 1, self.pk
+        if subquery and not self._meta.get_field('parent').is_cached(self):
+            parent = self.__class__._default_manager.filter(
+                pk=self.parent_id
+            ).order_by()
+            return (
+                Concat(
+                    Subquery(parent.values('path')), Value('/' + node),
+                    output_field=models.TextField()
+                ),
+                Subquery(parent.values('depth')) + 1,
+                Subquery(parent.values('root_id'))
+            )
+        parent = self.parent
+        return '%s/%s' % (parent.path, node), parent.depth + 1, parent.root_id
 
     @property
     def _nodes(self):
         """Get the nodes of the path."""
         return self.path.split('/')
 
-    @property
-    def depth(self):
-        """Get the depth of the tree."""
-        return len(self._nodes)
-
-    @property
-    def root(self):
-        """Get the id of the root node."""
-        return int(self._nodes[0])
-
     @property
     def ancestors(self):
         """Get all nodes in the path excluding the last one."""
-        return AbstractTreeModel.objects.filter(pk__in=self._nodes[:-1])
+        return self.__class__._default_manager.filter(
+            pk__in=map(decode_node, self._nodes[:-1])
+        )
 
     class Meta:
         abstract = True
@@ -130,10 +258,19 @@ class CommentAbstractModel(AbstractTreeModel, BaseCommentAbstractModel):
         verbose_name=_('user'), blank=True,
         null=True, on_delete=models.SET_NULL
     )
+    digest = models.CharField(
+        _('digest'), max_length=32, db_index=True, editable=False
+    )
 
     # Manager
     objects = CommentManager()
 
+    #: The fields that the digest is computed from.
+    digest_fields = frozenset((
+        'body', 'user', 'user_id', 'content_type',
+        'content_type_id', 'object_pk'
+    ))
+
     class Meta:
         abstract = True
         ordering = ('path', 'submit_date')
@@ -144,15 +281,28 @@ class CommentAbstractModel(AbstractTreeModel, BaseCommentAbstractModel):
         verbose_name_plural = _('comments')
 
     def __str__(self):
-        return '%s: %s...' % (self.user_display, strip_tags(self.body)[:50])
+        text = self.body_text
+        if text is None:
+            text = strip_tags(self.body)
+        return '%s: %s...' % (self.user_display, text[:50])
 
     @property
     def user_display(self):
         """Display the full name/username of the commenter."""
-        return get_user_display(self.user)
+        try:
+            return self._user_display
+        except AttributeError:
+            return get_user_display(self.user)
+
+    @user_display.setter
+    def user_display(self, value):
+        self._user_display = value
 
     def strip_body(self):
-        return strip_tags(self.body) if COMMENTS_ALLOW_HTML else self.body
+        if not COMMENTS_ALLOW_HTML:
+            return self.body
+        text = self.body_text
+        return strip_tags(self.body) if text is None else text
 
     def get_as_text(self):
         """
@@ -173,20 +323,69 @@ class CommentAbstractModel(AbstractTreeModel, BaseCommentAbstractModel):
         """Check if a comment can be edited or removed by a user."""
         return user == self.user
 
-    @transaction.atomic
-    def save(self, *args, **kwargs):
-        super(CommentAbstractModel, self).save(*args, **kwargs)
-        tree_path = str(self.id)
-        if self.parent:
-            tree_path = '%s/%s' % (self.parent.path, tree_path)
-            self.parent.leaf = self
-            CommentManager.filter(pk=self.parent_id).update(leaf=self.id)
-        self.path = tree_path
-        CommentManager.filter(id=self.id).update(path=self.path)
+    def make_digest(self):
+        """Compute the digest used to detect duplicate comments."""
+        return make_digest(
+            self.body, self.user_id, self.content_type_id, self.object_pk
+        )
+
+    def save(self, *args, update_leaf=True, **kwargs):
+        """
+        Save the comment. New comments are inserted along with their tree
+        path; pass ``update_leaf=False`` to leave the parent's ``leaf`` as is.
+        """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or \
+                not self.digest_fields.isdisjoint(update_fields):
+            self.digest = self.make_digest()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'digest'}
+        if not self._state.adding:
+            return super(CommentAbstractModel, self).save(*args, **kwargs)
+        using = kwargs.get('using') or \
+            router.db_for_write(self.__class__, instance=self)
+        reserved = False
+        if self.pk is None:
+            self.pk = self._reserve_pk(using)
+            reserved = self.pk is not None
+        update_leaf = update_leaf and self.parent_id is not None
+        # A single INSERT needs no transaction of its own.
+        if self.pk is None or update_leaf:
+            with transaction.atomic(using=using, savepoint=False):
+                self._insert_node(reserved, update_leaf, *args, **kwargs)
+        else:
+            self._insert_node(reserved, update_leaf, *args, **kwargs)
+
+    def _insert_node(self, reserved, update_leaf, *args, **kwargs):
+        manager = self.__class__._default_manager
+        if self.pk is None:
+            # The primary key could not be reserved, so the
+            # tree fields have to be set after the INSERT.
+            self.path, self.depth, self.root_id = '', 1, None
+            super(CommentAbstractModel, self).save(*args, **kwargs)
+            self.path, self.depth, self.root_id = self._tree_fields()
+            manager.filter(pk=self.pk).update(
+                path=self.path, depth=self.depth, root=self.root_id
+            )
+        else:
+            self.path, self.depth, self.root_id = \
+                self._tree_fields(subquery=reserved)
+            if reserved:
+                kwargs['force_insert'] = True
+            super(CommentAbstractModel, self).save(*args, **kwargs)
+            if not isinstance(self.path, str):
+                # Defer the tree fields so that
+                # they're only fetched if accessed.
+                for attname in ('path', 'depth', 'root_id'):
+                    del self.__dict__[attname]
+        if update_leaf:
+            if self._meta.get_field('parent').is_cached(self):
+                self.parent.leaf = self
+            manager.filter(pk=self.parent_id).update(leaf=self.pk)
 
     def delete(self, *args, **kwargs):
         if self.parent_id:
-            qs = CommentManager.filter(id=self.parent_id)
+            qs = self.__class__._default_manager.filter(id=self.parent_id)
             qs.update(leaf=models.Subquery(
                 qs.exclude(id=self.id).only('id')
                 .order_by('-submit_date').values('id')[:1]
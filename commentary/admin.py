@@ -1,18 +1,27 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _, ngettext
 
 from commentary import get_model
+from commentary.managers import with_user_displays
 from commentary.views.moderation import (
-    perform_flag, perform_approve, perform_delete
+    perform_bulk_flag, perform_bulk_approve, perform_bulk_delete
 )
 
 USERNAME_FIELD = 'user__' + get_user_model().USERNAME_FIELD
 
 
+class CommentChangeList(ChangeList):
+    """Resolve the display names of the users on a page at once."""
+    def get_results(self, request):
+        super(CommentChangeList, self).get_results(request)
+        self.result_list = with_user_displays(self.result_list)
+
+
 class CommentsAdmin(admin.ModelAdmin):
     list_display = (
-        'user', 'content_type', 'object_pk', 'parent',
+        'user_display', 'content_type', 'object_pk', 'parent',
         'submit_date', 'is_public', 'is_removed'
     )
     list_filter = (
@@ -24,6 +33,16 @@ class CommentsAdmin(admin.ModelAdmin):
     raw_id_fields = ('user', 'parent')
     search_fields = ('body', USERNAME_FIELD)
     actions = ('flag_comments', 'approve_comments', 'remove_comments')
+    list_select_related = ('user', 'content_type', 'parent__user')
+
+    def get_changelist(self, request, **kwargs):
+        return CommentChangeList
+
+    def user_display(self, obj):
+        return obj.user_display
+
+    user_display.short_description = _('user')
+    user_display.admin_order_field = USERNAME_FIELD
 
     def get_actions(self, request):
         actions = super(CommentsAdmin, self).get_actions(request)
@@ -37,7 +56,7 @@ class CommentsAdmin(admin.ModelAdmin):
 
     def flag_comments(self, request, queryset):
         self._bulk_flag(
-            request, queryset, perform_flag,
+            request, queryset, perform_bulk_flag,
             lambda n: ngettext('flagged', 'flagged', n)
         )
 
@@ -45,7 +64,7 @@ class CommentsAdmin(admin.ModelAdmin):
 
     def approve_comments(self, request, queryset):
         self._bulk_flag(
-            request, queryset, perform_approve,
+            request, queryset, perform_bulk_approve,
             lambda n: ngettext('approved', 'approved', n)
         )
 
@@ -53,7 +72,7 @@ class CommentsAdmin(admin.ModelAdmin):
 
     def remove_comments(self, request, queryset):
         self._bulk_flag(
-            request, queryset, perform_delete,
+            request, queryset, perform_bulk_delete,
             lambda n: ngettext('removed', 'removed', n)
         )
 
@@ -64,10 +83,7 @@ class CommentsAdmin(admin.ModelAdmin):
         Flag, approve, or remove some comments from an admin action.
         Actually calls the `action` argument to perform the heavy lifting.
         """
-        n_comments = 0
-        for comment in queryset:
-            action(request, comment)
-            n_comments += 1
+        n_comments = action(request, queryset)
         msg = ngettext(
             '%(count)s comment was successfully %(action)s.',
             '%(count)s comments were successfully %(action)s.', n_comments
@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class CommentaryConfig(AppConfig):
+    name = 'commentary'
+    verbose_name = 'Commentary'
+
+    def ready(self):
+        from . import get_model, signals
+        from .cache import invalidate_comment_list, invalidate_comment_lists
+
+        signals.comment_was_posted.connect(invalidate_comment_list)
+        signals.comment_was_flagged.connect(invalidate_comment_list)
+        signals.comments_were_flagged.connect(invalidate_comment_lists)
+        post_save.connect(invalidate_comment_list, sender=get_model())
+        post_delete.connect(invalidate_comment_list, sender=get_model())
@@ -0,0 +1,84 @@
+"""
+Caching of rendered comment lists.
+
+Each object has a list version stored in the cache, which is part of the
+keys of its rendered lists. Changing the version whenever a comment of the
+object changes invalidates all of its lists without having to find them.
+"""
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.utils.translation import get_language
+
+import commentary
+
+#: The number of comment ids looked up in each query.
+BATCH_SIZE = 500
+
+
+def _get_cache():
+    return caches[commentary.COMMENTS_CACHE]
+
+
+def _version_key(ctype_id, object_pk, site_id):
+    return 'commentary.version.%s' % md5((
+        '%s:%s:%s' % (ctype_id, object_pk, site_id)
+    ).encode()).hexdigest()
+
+
+def get_list_version(ctype_id, object_pk, site_id):
+    """Get the current list version of an object."""
+    cache = _get_cache()
+    key = _version_key(ctype_id, object_pk, site_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_list_version(ctype_id, object_pk, site_id):
+    """Change the list version of an object, invalidating its lists."""
+    _get_cache().set(
+        _version_key(ctype_id, object_pk, site_id), uuid4().hex, None
+    )
+
+
+def list_cache_key(ctype_id, object_pk, site_id, template_name):
+    """Get the cache key of a rendered comment list of an object."""
+    version = get_list_version(ctype_id, object_pk, site_id)
+    return 'commentary.list.%s' % md5((
+        '%s:%s:%s:%s:%s:%s' % (
+            ctype_id, object_pk, site_id,
+            template_name, get_language(), version
+        )
+    ).encode()).hexdigest()
+
+
+def invalidate_comment_list(sender, comment=None, instance=None, **kwargs):
+    """Signal receiver that invalidates the lists of a comment's object."""
+    if commentary.COMMENTS_CACHE is None:
+        return
+    comment = comment or instance
+    bump_list_version(
+        comment.content_type_id, comment.object_pk, comment.site_id
+    )
+
+
+def invalidate_comment_lists(sender, comment_ids, **kwargs):
+    """
+    Signal receiver that invalidates the lists of the objects
+    of many comments, given the model and ids of the comments.
+    """
+    if commentary.COMMENTS_CACHE is None:
+        return
+    manager = sender._default_manager
+    objects = set()
+    for start in range(0, len(comment_ids), BATCH_SIZE):
+        objects.update(manager.filter(
+            pk__in=comment_ids[start:start + BATCH_SIZE]
+        ).order_by().values_list('content_type', 'object_pk', 'site'))
+    for ctype_id, object_pk, site_id in objects:
+        bump_list_version(ctype_id, object_pk, site_id)
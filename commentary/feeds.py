@@ -2,7 +2,7 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.syndication.views import Feed
 from django.utils.translation import gettext as _
 
-from . import get_model
+from . import attach_user_displays, get_model
 
 
 class LatestCommentFeed(Feed):
@@ -19,6 +19,10 @@ class LatestCommentFeed(Feed):
             'site_name': self.site.name
         }
 
+    @property
+    def link(self):
+        return 'http://%s/' % self.site.domain
+
     @property
     def description(self):
         return _('Latest comments on %(site_name)s') % {
@@ -27,11 +31,13 @@ class LatestCommentFeed(Feed):
 
     @property
     def items(self):
-        return get_model().objects.filter(
-            site__pk=self.site.pk,
-            is_public=True,
-            is_removed=False,
-        ).order_by('-submit_date')[:40]
+        return attach_user_displays(list(
+            get_model().objects.filter(
+                site__pk=self.site.pk,
+                is_public=True,
+                is_removed=False,
+            ).select_related('user').order_by('-submit_date')[:40]
+        ))
 
     def item_pubdate(self, item):
         return item.submit_date
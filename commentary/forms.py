@@ -1,14 +1,16 @@
+from datetime import timedelta
 from time import time
 
 from django import forms
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.forms.utils import ErrorDict
+from django.utils import timezone
 from django.utils.crypto import salted_hmac, constant_time_compare
 from django.utils.encoding import force_text
 from django.utils.translation import gettext_lazy as _
 
-from . import COMMENTS_TIMEOUT, COMMENTS_WIDGET, get_model
+from . import COMMENTS_TIMEOUT, COMMENTS_WIDGET, get_model, metrics
 
 
 class CommentSecurityForm(forms.Form):
@@ -52,11 +54,12 @@ class CommentSecurityForm(forms.Form):
 
     def clean_security_hash(self):
         """Check the security hash."""
-        expected_hash = self.generate_security_hash(
-            self.data.get('content_type', ''),
-            self.data.get('object_pk', ''),
-            self.data.get('timestamp', '')
-        )
+        with metrics.timer('post_comment.security_hash'):
+            expected_hash = self.generate_security_hash(
+                self.data.get('content_type', ''),
+                self.data.get('object_pk', ''),
+                self.data.get('timestamp', '')
+            )
         actual_hash = self.cleaned_data['security_hash']
         if not constant_time_compare(expected_hash, actual_hash):
             raise forms.ValidationError('Security hash check failed.')
@@ -109,21 +112,29 @@ class CommentForm(CommentSecurityForm):
 
     _model = get_model()
 
-    def get_comment_object(self, site_id=settings.SITE_ID):
+    def get_comment_object(self, site_id=settings.SITE_ID, user=None):
         if not self.is_valid():
             raise ValueError('Invalid form')
         return self._prevent_duplicates(self._model(
             content_type=ContentType.objects.get_for_model(self.target_object),
             object_pk=force_text(self.target_object._get_pk_val()),
-            body=self.cleaned_data['comment'], site_id=site_id
+            body=self.cleaned_data['comment'], site_id=site_id, user=user
         ))
 
     def _prevent_duplicates(self, new):
-        comments = self._model.objects.filter(
-            content_type=new.content_type, user=new.user,
-            object_pk=new.object_pk, body=new.body
-        )
-        return next((c for c in comments if c._date == new._date), new)
+        """
+        Return a comment with the same digest posted on the same
+        day if there is one, or the new comment otherwise.
+        """
+        now = timezone.now()
+        if timezone.is_aware(now):
+            now = timezone.localtime(now)
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        duplicate = self._model.objects.filter(
+            digest=new.make_digest(), submit_date__gte=day,
+            submit_date__lt=day + timedelta(days=1)
+        ).order_by()[:1]
+        return next(iter(duplicate), new)
 
     class Meta:
         fields = (
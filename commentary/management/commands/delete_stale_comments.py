@@ -1,6 +1,10 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from django_comments.models import Comment
+from commentary import get_model
+from commentary.models import CommentCounter
 
 
 class Command(BaseCommand):
@@ -12,31 +16,139 @@ class Command(BaseCommand):
             '-y', '--yes', default='x', action='store_const', const='y',
             dest='answer', help='Automatically confirm deletion',
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of objects to check in each query',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only count the stale comments, don't delete them",
+        )
+        parser.add_argument(
+            '--include-missing-models', action='store_true',
+            help='Treat the comments on models that are not installed '
+                 'anymore as stale, instead of skipping them',
+        )
 
     def handle(self, *args, **kwargs):
-        verbose = kwargs['verbosity'] >= 1
-        answer = kwargs['answer']
-
+        self.verbosity = kwargs['verbosity']
+        self.dry_run = kwargs['dry_run']
+        self.include_missing_models = kwargs['include_missing_models']
         # -v0 sets --yes
-        if not verbose:
-            answer = 'y'
-
-        for comment in Comment.objects.all():
-            if comment.content_object is None:
-                if verbose:
-                    self.stdout.write(
-                        "Comment `%s' to non-existing `%s' with PK `%s'" %
-                        (comment, comment.content_type.model, comment.object_pk))
-
-                while answer not in 'yn':
-                    answer = input("Do you wish to delete? [yN] ")
-                    if not answer:
-                        answer = 'x'
-                        continue
-                    answer = answer[0].lower()
-
-                if answer == 'y' :
-                    comment.delete()
-
-                    if verbose:
-                        self.stdout.write("Deleted comment `%s'" % comment)
+        self.answer = kwargs['answer'] if self.verbosity >= 1 else 'y'
+
+        model = get_model()
+        ctype_ids = model._default_manager.order_by() \
+            .values_list('content_type', flat=True).distinct()
+        total = 0
+        for ctype in ContentType.objects.filter(pk__in=list(ctype_ids)):
+            total += self.handle_content_type(
+                model, ctype, kwargs['batch_size']
+            )
+
+        if self.verbosity >= 1:
+            if self.dry_run:
+                self.stdout.write('Found %d stale comments.' % total)
+            else:
+                self.stdout.write('Deleted %d stale comments.' % total)
+
+    def handle_content_type(self, model, ctype, batch_size):
+        """
+        Check the objects of a content type which have comments in batches,
+        and delete the comments of those that don't exist anymore.
+        """
+        comments = model._default_manager.filter(content_type=ctype)
+        target = ctype.model_class()
+        if target is None and not self.include_missing_models:
+            # The app of the model may only be uninstalled temporarily.
+            if self.verbosity >= 1:
+                self.stdout.write(
+                    "Skipped %d comments on `%s' objects, whose model "
+                    "is not installed" % (
+                        comments.count(), '.'.join(ctype.natural_key())
+                    )
+                )
+            return 0
+        object_pks = comments.order_by('object_pk') \
+            .values_list('object_pk', flat=True).distinct()
+        checked = stale_count = deleted = 0
+        last_pk = None
+        while True:
+            if last_pk is not None:
+                batch = object_pks.filter(object_pk__gt=last_pk)
+            else:
+                batch = object_pks
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]
+            checked += len(batch)
+            stale = self.find_stale(target, batch)
+            if stale:
+                stale_count += len(stale)
+                deleted += self.delete(model, comments, ctype, stale)
+            if self.verbosity >= 2:
+                self.stdout.write(
+                    '%s: checked %d objects, %d missing' % (
+                        ctype, checked, stale_count
+                    )
+                )
+        if self.verbosity >= 1 and stale_count:
+            self.stdout.write(
+                "%d comments on %d non-existing `%s' objects" % (
+                    deleted, stale_count, ctype.model
+                )
+            )
+        return deleted
+
+    def find_stale(self, target, object_pks):
+        """Return the object pks which don't match an existing object."""
+        if target is None:
+            # The model isn't installed, and was included explicitly.
+            return object_pks
+        pk_field = target._meta.pk
+        values = {}
+        stale = []
+        for object_pk in object_pks:
+            try:
+                values.setdefault(
+                    pk_field.to_python(object_pk), []
+                ).append(object_pk)
+            except ValidationError:
+                stale.append(object_pk)
+        existing = set(target._base_manager.filter(
+            pk__in=list(values)
+        ).values_list('pk', flat=True))
+        for value, value_pks in values.items():
+            if value not in existing:
+                stale.extend(value_pks)
+        return stale
+
+    def confirm(self):
+        while self.answer not in 'yn':
+            answer = input('Do you wish to delete? [yN] ')
+            self.answer = answer[0].lower() if answer else 'x'
+        if self.answer == 'n':
+            self.dry_run = True
+        return self.answer == 'y'
+
+    def delete(self, model, comments, ctype, stale):
+        """
+        Delete the comments on some stale objects in one transaction,
+        along with their counters. Returns the number of comments.
+        """
+        comments = comments.filter(object_pk__in=stale)
+        if not self.dry_run and self.answer not in 'yn':
+            self.stdout.write(
+                "%d comments on non-existing `%s' objects" % (
+                    comments.count(), ctype.model
+                )
+            )
+        if self.dry_run or not self.confirm():
+            return comments.count()
+        with transaction.atomic(using=comments.db):
+            CommentCounter.objects.filter(
+                content_type=ctype, object_pk__in=stale
+            ).delete()
+            deleted = comments.delete()[1]
+        return deleted.get(model._meta.label, 0)
@@ -0,0 +1,197 @@
+import random
+from datetime import timedelta
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.utils import timezone
+
+from commentary import get_model
+from commentary.abstracts import CommentAbstractModel
+from commentary.models import CommentFlag
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua enim ad minim '
+    'veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea '
+    'commodo consequat duis aute irure in reprehenderit voluptate velit esse '
+    'cillum fugiat nulla pariatur excepteur sint occaecat cupidatat non '
+    'proident sunt culpa qui officia deserunt mollit anim id est laborum'
+).split()
+
+#: The chance of a comment of the ``random`` shape being a reply.
+REPLY_RATIO = 0.75
+
+
+class Command(BaseCommand):
+    help = 'Generate random comments on existing objects, for testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='+', metavar='app_label.ModelName',
+            help='Models of the objects to comment on',
+        )
+        parser.add_argument(
+            '--count', type=int, default=1000,
+            help='Number of comments to generate',
+        )
+        parser.add_argument(
+            '--objects', type=int, default=100,
+            help='Maximum number of objects of each model to comment on',
+        )
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Number of users to comment as, created if missing',
+        )
+        parser.add_argument(
+            '--shape', choices=('random', 'wide', 'deep'), default='random',
+            help='Shape of the comment trees: random replies, only '
+                 'top-level comments, or chains of replies',
+        )
+        parser.add_argument(
+            '--max-depth', type=int, default=10,
+            help='Maximum depth of the replies',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Number of past days to spread the comments over',
+        )
+        parser.add_argument(
+            '--flagged', type=float, default=0.01,
+            help='Ratio of comments flagged for removal',
+        )
+        parser.add_argument(
+            '--unapproved', type=float, default=0.05,
+            help='Ratio of comments that are not public',
+        )
+        parser.add_argument(
+            '--removed', type=float, default=0.01,
+            help='Ratio of removed comments',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of comments to insert in each batch',
+        )
+        parser.add_argument(
+            '--seed', type=int, help='Seed of the random generator',
+        )
+
+    def handle(self, *args, **kwargs):
+        self.options = kwargs
+        self.random = random.Random(kwargs['seed'])
+        model = get_model()
+        if not issubclass(model, CommentAbstractModel):
+            raise CommandError(
+                'Comments can only be generated for tree comment models.'
+            )
+        using = router.db_for_write(model)
+        targets = self.get_targets(kwargs['models'], kwargs['objects'])
+        self.users = self.get_users(kwargs['users'])
+        self.site_id = Site.objects.get_current().pk
+        self.flagged = []
+
+        with transaction.atomic(using=using):
+            manager = model._default_manager.db_manager(using)
+            generated = manager.bulk_create_tree(
+                self.generate_comments(model, targets),
+                batch_size=kwargs['batch_size']
+            )
+            CommentFlag.objects.using(using).bulk_create((
+                CommentFlag(
+                    user_id=self.pick_user(), comment_id=comment.pk,
+                    flag=CommentFlag.SUGGEST_REMOVAL
+                ) for comment in self.flagged
+            ), batch_size=kwargs['batch_size'])
+        if kwargs['verbosity'] >= 1:
+            self.stdout.write('Generated %d comments.' % generated)
+
+    def get_targets(self, labels, limit):
+        """List the content types and primary keys of the objects."""
+        targets = []
+        for label in labels:
+            try:
+                target = apps.get_model(label)
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            ctype = ContentType.objects.get_for_model(target)
+            targets.extend(
+                (ctype, str(pk)) for pk in target._default_manager
+                .order_by('pk').values_list('pk', flat=True)[:limit]
+            )
+        if not targets:
+            raise CommandError('There are no objects to comment on.')
+        return targets
+
+    def get_users(self, count):
+        """Get the primary keys of the users, creating the missing ones."""
+        user_model = get_user_model()
+        username_field = user_model.USERNAME_FIELD
+        names = ['commenter%d' % n for n in range(1, count + 1)]
+        user_model._default_manager.bulk_create([
+            user_model(**{
+                username_field: name, 'password': make_password(None)
+            }) for name in names
+        ], ignore_conflicts=True)
+        return list(user_model._default_manager.filter(**{
+            '%s__in' % username_field: names
+        }).order_by('pk').values_list('pk', flat=True))
+
+    def generate_comments(self, model, targets):
+        """Generate the comments on each object, oldest first."""
+        options = self.options
+        count = options['count']
+        step = timedelta(days=options['days']) / max(count, 1)
+        date = timezone.now() - step * count
+        generated = 0
+        for n, (ctype, object_pk) in enumerate(targets):
+            # The comments that the next comment can reply to.
+            subtree = []
+            for _ in range(count // len(targets) + (n < count % len(targets))):
+                parent = self.pick_parent(subtree)
+                if parent is None:
+                    subtree = []
+                date += step
+                comment = model(
+                    content_type=ctype, object_pk=object_pk, parent=parent,
+                    site_id=self.site_id, user_id=self.pick_user(),
+                    body=self.generate_body(), submit_date=date,
+                    is_public=self.random.random() >= options['unapproved'],
+                    is_removed=self.random.random() < options['removed']
+                )
+                if self.users and self.random.random() < options['flagged']:
+                    self.flagged.append(comment)
+                # The tree fields are set once the comment is yielded.
+                yield comment
+                subtree.append(comment)
+                generated += 1
+                if options['verbosity'] >= 2 and \
+                        generated % options['batch_size'] == 0:
+                    self.stdout.write(
+                        'Generated %d of %d comments' % (generated, count)
+                    )
+
+    def pick_parent(self, subtree):
+        """Pick the parent of the next comment from the current subtree."""
+        shape = self.options['shape']
+        if not subtree or shape == 'wide' or \
+                len(subtree) >= self.options['batch_size']:
+            return None
+        if shape == 'deep':
+            parent = subtree[-1]
+        elif self.random.random() < REPLY_RATIO:
+            parent = self.random.choice(subtree)
+        else:
+            return None
+        return parent if parent.depth < self.options['max_depth'] else None
+
+    def pick_user(self):
+        return self.random.choice(self.users) if self.users else None
+
+    def generate_body(self):
+        return ' '.join(self.random.choices(
+            WORDS, k=self.random.randint(3, 60)
+        )).capitalize() + '.'
@@ -0,0 +1,161 @@
+import json
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from commentary import get_model
+from commentary.abstracts import CommentAbstractModel
+
+
+class Command(BaseCommand):
+    help = 'Import comments from a file with one JSON object per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', help='Path of the file to import, or - for stdin',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of comments to insert in each batch',
+        )
+
+    def handle(self, *args, **kwargs):
+        self.options = kwargs
+        model = get_model()
+        if not issubclass(model, CommentAbstractModel):
+            raise CommandError(
+                'Comments can only be imported into tree comment models.'
+            )
+        self.model = model
+        # The comments by their id in the file, including the parents
+        # that are referenced before their line. Once a comment is
+        # inserted, only the fields that its replies need are kept.
+        self.comments = {}
+        # The ids of the lines read so far.
+        self.seen = set()
+        # The comments that may not have been inserted yet.
+        self.pending = []
+        self.users = {}
+        if kwargs['file'] == '-':
+            imported = self.import_file(sys.stdin, kwargs['batch_size'])
+        else:
+            with open(kwargs['file'], encoding='utf-8') as f:
+                imported = self.import_file(f, kwargs['batch_size'])
+        if kwargs['verbosity'] >= 1:
+            self.stdout.write('Imported %d comments.' % imported)
+
+    def import_file(self, lines, batch_size):
+        try:
+            return self.model._default_manager.bulk_create_tree(
+                self.parse(lines), batch_size=batch_size
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+    def parse(self, lines):
+        """Yield a new comment for each line of the file."""
+        compact_at = self.options['batch_size']
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+                key = str(data['id'])
+                if key in self.seen:
+                    raise ValueError('Duplicate comment id %r' % data['id'])
+                self.seen.add(key)
+                comment = self.make_comment(key, data)
+            except (
+                LookupError, ObjectDoesNotExist, TypeError, ValueError
+            ) as e:
+                raise CommandError('Line %d: %s: %s' % (
+                    number, e.__class__.__name__, e
+                ))
+            yield comment
+            self.pending.append((key, comment))
+            if len(self.pending) >= compact_at:
+                self.compact()
+                compact_at = max(
+                    self.options['batch_size'], 2 * len(self.pending)
+                )
+
+    def compact(self):
+        """
+        Replace the inserted comments by the tree fields
+        that their replies need, to release their bodies.
+        """
+        pending = []
+        for key, comment in self.pending:
+            if comment._state.adding:
+                pending.append((key, comment))
+            else:
+                self.comments[key] = (
+                    comment.pk, comment.path, comment.depth, comment.root_id
+                )
+        self.pending = pending
+
+    def get_comment(self, key):
+        """
+        Get the comment with an id of the file. A comment that's
+        referenced before its line is filled in when it's reached.
+        """
+        key = str(key)
+        comment = self.comments.get(key)
+        if comment is None:
+            comment = self.comments[key] = self.model()
+        elif isinstance(comment, tuple):
+            # An inserted comment, which is only a parent from now on.
+            pk, path, depth, root_id = comment
+            comment = self.model(
+                pk=pk, path=path, depth=depth, root_id=root_id
+            )
+            comment._state.adding = False
+        return comment
+
+    def get_user(self, username):
+        """Get the id of a user by username, looking up each user once."""
+        if username not in self.users:
+            user_model = get_user_model()
+            try:
+                self.users[username] = user_model._default_manager \
+                    .values_list('pk', flat=True) \
+                    .get(**{user_model.USERNAME_FIELD: username})
+            except user_model.DoesNotExist:
+                raise ValueError('Unknown user %r' % username)
+        return self.users[username]
+
+    def parse_date(self, value):
+        if value is None:
+            return None
+        date = parse_datetime(value)
+        if date is None:
+            raise ValueError('Invalid date %r' % value)
+        if settings.USE_TZ and timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        elif not settings.USE_TZ and timezone.is_aware(date):
+            date = timezone.make_naive(date)
+        return date
+
+    def make_comment(self, key, data):
+        comment = self.get_comment(key)
+        comment.content_type = ContentType.objects.get_by_natural_key(
+            *data['content_type'].split('.', 1)
+        )
+        comment.object_pk = str(data['object_pk'])
+        comment.site_id = data.get('site', settings.SITE_ID)
+        comment.body = data['body']
+        if data.get('user') is not None:
+            comment.user_id = self.get_user(data['user'])
+        if data.get('parent') is not None:
+            comment.parent = self.get_comment(data['parent'])
+        comment.submit_date = self.parse_date(data.get('submit_date'))
+        comment.edit_date = self.parse_date(data.get('edit_date'))
+        comment.is_public = data.get('is_public', True)
+        comment.is_removed = data.get('is_removed', False)
+        return comment
@@ -0,0 +1,28 @@
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from commentary.models import CommentNotification
+
+
+class Command(BaseCommand):
+    help = 'Send the comment notifications queued in the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of notifications to send in each batch',
+        )
+
+    def handle(self, *args, **kwargs):
+        sent = 0
+        # Reuse a single mail connection for all the batches.
+        with get_connection() as connection:
+            while True:
+                count = CommentNotification.objects.send_batch(
+                    connection, batch_size=kwargs['batch_size']
+                )
+                if not count:
+                    break
+                sent += count
+        if kwargs['verbosity'] >= 1:
+            self.stdout.write('Sent %d comment notifications.' % sent)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from commentary import get_model
+from commentary.models import CommentCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the comment counters from the existing comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of counters to insert in each query',
+        )
+
+    def handle(self, *args, **kwargs):
+        created = CommentCounter.objects.rebuild(
+            get_model().objects.all(), batch_size=kwargs['batch_size']
+        )
+        if kwargs['verbosity'] >= 1:
+            self.stdout.write('Rebuilt %d comment counters.' % created)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from commentary import get_model
+
+
+class Command(BaseCommand):
+    help = 'Render the HTML and plain text bodies of the comments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of comments to update in each query',
+        )
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only render the comments that have not been rendered yet',
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        manager = get_model().objects
+        queryset = manager.only('pk', 'body').order_by('pk')
+        if kwargs['missing']:
+            queryset = queryset.filter(body_html__isnull=True)
+        rendered, last_pk = 0, None
+        while True:
+            batch = queryset if last_pk is None \
+                else queryset.filter(pk__gt=last_pk)
+            comments = list(batch[:batch_size])
+            if not comments:
+                break
+            for comment in comments:
+                comment.render_body()
+            manager.bulk_update(
+                comments, ('body_html', 'body_text')
+            )
+            rendered += len(comments)
+            last_pk = comments[-1].pk
+        if kwargs['verbosity'] >= 1:
+            self.stdout.write('Rendered %d comments.' % rendered)
@@ -1,8 +1,77 @@
-from django.db import models
+import itertools
+
+from django.core.mail import send_mass_mail
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models.functions import Greatest
+from django.db.models.query import ModelIterable
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 from django.utils.encoding import force_text
 
 
+def count_by_object(queryset, ctype, pks):
+    """
+    Count the comments of a queryset on each of the objects of a content type
+    with the given primary keys, in a single grouped query.
+    """
+    counts = dict.fromkeys(pks, 0)
+    object_pks = {force_text(pk): pk for pk in counts}
+    if object_pks:
+        rows = queryset.filter(
+            content_type=ctype, object_pk__in=object_pks
+        ).order_by().values_list('object_pk').annotate(models.Count('pk'))
+        for object_pk, count in rows:
+            counts[object_pks[object_pk]] = count
+    return counts
+
+
+def count_public_by_object(queryset, ctype, pks, site_id):
+    """
+    Like ``count_by_object``, for a queryset of the public comments
+    of a site which have not been removed. If ``COMMENTS_USE_COUNTERS``
+    is enabled, the counts are read from the comment counters and
+    only the objects without a counter are counted from the queryset.
+    """
+    from . import COMMENTS_USE_COUNTERS
+    if not COMMENTS_USE_COUNTERS:
+        return count_by_object(queryset, ctype, pks)
+    from .models import CommentCounter
+    counts = CommentCounter.objects.get_counts(ctype, pks, site_id)
+    missing = [pk for pk in pks if pk not in counts]
+    if missing:
+        counts.update(count_by_object(queryset, ctype, missing))
+    return counts
+
+
+class UserDisplayIterable(ModelIterable):
+    """
+    Yield the comments of a queryset with the display names of their
+    users, and of their parents' users if the parents are fetched too,
+    resolved at once with ``attach_user_displays``.
+    """
+    def __iter__(self):
+        from . import attach_user_displays
+        comments = list(super(UserDisplayIterable, self).__iter__())
+        parent_field = self.queryset.model._meta.get_field('parent')
+        parents = [
+            c.parent for c in comments
+            if c.parent_id is not None and parent_field.is_cached(c)
+        ]
+        attach_user_displays(comments + parents)
+        return iter(comments)
+
+
+def with_user_displays(queryset):
+    """
+    Get a copy of a queryset of comments which attaches the display
+    names of their users when it's evaluated. The users should be
+    fetched with ``select_related()``.
+    """
+    queryset = queryset._chain()
+    queryset._iterable_class = UserDisplayIterable
+    return queryset
+
+
 class CommentManager(models.Manager):
     def in_moderation(self):
         """
@@ -21,6 +90,46 @@ class CommentManager(models.Manager):
             qs = qs.filter(object_pk=force_text(model._get_pk_val()))
         return qs
 
+    def count_for_objects(self, objects, **filters):
+        """
+        Dict mapping the primary keys of a list of objects of the same model
+        to their number of comments, optionally filtered by ``filters``.
+        """
+        objects = list(objects)
+        if not objects:
+            return {}
+        ct = ContentType.objects.get_for_model(objects[0])
+        return count_by_object(
+            self.get_queryset().filter(**filters),
+            ct, [obj._get_pk_val() for obj in objects]
+        )
+
+    def public_count_for_objects(self, objects, site_id):
+        """
+        Dict mapping the primary keys of a list of objects of the same model
+        to their number of public comments on a site which have not been
+        removed, read from the comment counters if they are enabled.
+        """
+        objects = list(objects)
+        if not objects:
+            return {}
+        ct = ContentType.objects.get_for_model(objects[0])
+        return count_public_by_object(
+            self.get_queryset().filter(
+                site__pk=site_id, is_public=True, is_removed=False
+            ), ct, [obj._get_pk_val() for obj in objects], site_id
+        )
+
+    def rows(self, queryset=None):
+        """
+        List of lightweight read-only rows for a queryset of
+        comments (all comments by default), for rendering.
+        """
+        from .rows import fetch_rows
+        if queryset is None:
+            queryset = self.get_queryset()
+        return fetch_rows(queryset)
+
     def top_level(self, model=None):
         """QuerySet for all top level comments."""
         if model is None:
@@ -28,3 +137,371 @@ class CommentManager(models.Manager):
         else:
             qs = self.for_model(model)
         return qs.filter(parent=None)
+
+    def ancestors(self, comment):
+        """QuerySet for all the ancestors of a comment."""
+        from .abstracts import decode_node
+        nodes = comment.path.split('/')[:-1]
+        return self.get_queryset().filter(pk__in=map(decode_node, nodes))
+
+    def descendants(self, comment, max_depth=None):
+        """
+        QuerySet for all the descendants of a comment, optionally
+        limited to ``max_depth`` levels of replies below it.
+        """
+        qs = self.get_queryset().filter(path__startswith=comment.path + '/')
+        if max_depth is not None:
+            qs = qs.filter(depth__lte=comment.depth + max_depth)
+        return qs
+
+    def subtree(self, root_ids):
+        """
+        QuerySet for the top level comments with the given ids
+        along with all of their descendants.
+        """
+        return self.get_queryset().filter(root__in=root_ids)
+
+    def bulk_create_tree(self, comments, batch_size=1000):
+        """
+        Insert an iterable of new comments in batches, in one transaction.
+        Their primary keys, tree paths and leaves are assigned in memory.
+        The ``parent`` of a comment can be an existing comment or another
+        comment of the iterable, even one that comes after it. Dates that
+        are set on the comments are kept. Returns the number of comments.
+
+        The primary keys are reserved from the sequence on PostgreSQL. On
+        other databases they follow the current largest one, so no other
+        comments may be saved until the transaction is committed.
+        """
+        from . import COMMENTS_CACHE, COMMENTS_USE_COUNTERS
+        from .models import CommentCounter
+        with transaction.atomic(using=self.db):
+            inserter = _TreeInserter(self, batch_size)
+            for comment in comments:
+                inserter.add(comment)
+            inserter.finish()
+            if COMMENTS_USE_COUNTERS:
+                CommentCounter.objects.db_manager(self.db).add_many(
+                    self.model, inserter.public_counts(), 1
+                )
+        if COMMENTS_CACHE is not None:
+            from .cache import bump_list_version
+            for key in inserter.objects:
+                bump_list_version(*key)
+        return inserter.inserted
+
+
+class _TreeInserter(object):
+    """
+    Assign the primary keys and tree fields of new comments and insert
+    them in batches for ``CommentManager.bulk_create_tree``. Comments
+    whose parent hasn't been added yet wait for it, and are inserted
+    right after it.
+    """
+    def __init__(self, manager, batch_size):
+        self.manager = manager
+        self.model = manager.model
+        self.batch_size = batch_size
+        self.pks = self._new_pks()
+        # The first new primary key; comments before it existed already.
+        self.first_pk = None
+        self.now = timezone.now()
+        # The new comments waiting for their parent, by parent.
+        self.waiting = {}
+        # The comments waiting for the tree fields of an existing parent.
+        self.waiting_existing = {}
+        # The new parents and the date and id of their latest reply.
+        self.leaves = {}
+        # The new parents whose leaf changed after they were inserted.
+        self.stale_leaves = set()
+        # Whether the leaf of a parent can reference a reply that is
+        # inserted later, since constraints are checked on commit.
+        self.defer_leaves = connections[manager.db].features \
+            .can_defer_constraint_checks
+        # The existing comments that have new replies.
+        self.existing_parents = set()
+        self.ready = []
+        self.inserted = 0
+        # The objects of the comments and their number of public ones.
+        self.objects = set()
+        self.public = {}
+
+    def _new_pks(self):
+        """Yield the primary keys of the new comments."""
+        connection = connections[self.manager.db]
+        opts = self.model._meta
+        if connection.vendor == 'postgresql':
+            # Take them from the sequence, like AbstractTreeModel.save().
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                        'FROM generate_series(1, %s)',
+                        (opts.db_table, opts.pk.column, self.batch_size)
+                    )
+                    for pk, in cursor.fetchall():
+                        yield pk
+        # Comments saved concurrently would take the same keys,
+        # and make the INSERT fail when they're committed.
+        last_pk = self.manager.aggregate(models.Max('pk'))['pk__max']
+        yield from itertools.count((last_pk or 0) + 1)
+
+    def add(self, comment):
+        """Add a new comment, which is inserted once its parent is known."""
+        comment.pk = next(self.pks)
+        if self.first_pk is None:
+            self.first_pk = comment.pk
+        comment.render_body()
+        comment.digest = comment.make_digest()
+        if comment.submit_date is None:
+            comment.submit_date = self.now
+        if comment.edit_date is None:
+            comment.edit_date = comment.submit_date
+        parent_field = self.model._meta.get_field('parent')
+        parent = comment.parent if parent_field.is_cached(comment) else None
+        if parent is None and comment.parent_id is None:
+            self.place(comment, None)
+        elif parent is None:
+            # Only the id of an existing parent is known.
+            self.waiting_existing.setdefault(
+                comment.parent_id, []
+            ).append(comment)
+        elif not parent.path:
+            # The parent is a new comment that hasn't been added yet.
+            self.waiting.setdefault(id(parent), []).append(comment)
+        else:
+            self.place(comment, parent)
+
+    def place(self, comment, parent):
+        """
+        Set the tree fields of a comment from those of its parent and
+        queue it for insertion, along with the replies waiting for it.
+        """
+        from .abstracts import encode_node
+        stack = [(comment, parent)]
+        while stack:
+            comment, parent = stack.pop()
+            node = encode_node(comment.pk)
+            if parent is None:
+                comment.path, comment.depth, comment.root_id = \
+                    node, 1, comment.pk
+            else:
+                comment.parent_id = parent.pk
+                comment.path = '%s/%s' % (parent.path, node)
+                comment.depth = parent.depth + 1
+                comment.root_id = parent.root_id
+                if parent.pk < self.first_pk:
+                    self.existing_parents.add(parent.pk)
+                else:
+                    self.set_leaf(comment, parent)
+            self.ready.append(comment)
+            stack.extend(
+                (reply, comment)
+                for reply in self.waiting.pop(id(comment), ())
+            )
+        if len(self.ready) >= self.batch_size:
+            self.flush()
+
+    def set_leaf(self, comment, parent):
+        """Make a comment the leaf of its parent if it's the latest reply."""
+        leaf = self.leaves.get(parent.pk)
+        if leaf is not None and leaf[0] > comment.submit_date:
+            return
+        self.leaves[parent.pk] = (comment.submit_date, comment.pk)
+        if parent._state.adding and self.defer_leaves:
+            parent.leaf_id = comment.pk
+        else:
+            self.stale_leaves.add(parent.pk)
+
+    def flush(self):
+        """Insert the queued comments and update the leaves of parents."""
+        comments, self.ready = self.ready, []
+        if not comments:
+            return
+        connection = connections[self.manager.db]
+        fields = self.model._meta.concrete_fields
+        batch_size = min(
+            self.batch_size, connection.ops.bulk_batch_size(fields, comments)
+        ) or 1
+        for start in range(0, len(comments), batch_size):
+            # Unlike bulk_create(), a raw insert keeps the
+            # dates instead of applying auto_now(_add).
+            self.manager._insert(
+                comments[start:start + batch_size], fields=fields,
+                using=self.manager.db, raw=True
+            )
+        for comment in comments:
+            comment._state.adding = False
+            comment._state.db = self.manager.db
+            key = (comment.content_type_id, comment.object_pk, comment.site_id)
+            self.objects.add(key)
+            if comment.is_public and not comment.is_removed:
+                self.public[key] = self.public.get(key, 0) + 1
+        self.inserted += len(comments)
+        self.manager.bulk_update([
+            self.model(pk=pk, leaf_id=self.leaves[pk][1])
+            for pk in self.stale_leaves
+        ], ('leaf',), batch_size=self.batch_size)
+        self.stale_leaves.clear()
+
+    def finish(self):
+        """
+        Place the comments replying to existing comments, insert
+        everything left and update the leaves of the existing parents.
+        """
+        pks = list(self.waiting_existing)
+        for start in range(0, len(pks), self.batch_size):
+            parents = self.manager.filter(
+                pk__in=pks[start:start + self.batch_size]
+            ).only('path', 'depth', 'root')
+            for parent in parents:
+                for comment in self.waiting_existing.pop(parent.pk):
+                    self.place(comment, parent)
+        if self.waiting or self.waiting_existing:
+            raise ValueError(
+                'The parents of some comments are neither existing '
+                'comments nor part of the new comments.'
+            )
+        self.flush()
+        self.update_existing_leaves()
+
+    def update_existing_leaves(self):
+        """
+        Update the leaves of the existing parents of new comments,
+        which may have later replies than the new ones.
+        """
+        pks = list(self.existing_parents)
+        latest = self.manager.filter(
+            parent=models.OuterRef('pk')
+        ).order_by('-submit_date', '-pk').values('pk')[:1]
+        for start in range(0, len(pks), self.batch_size):
+            self.manager.filter(
+                pk__in=pks[start:start + self.batch_size]
+            ).update(leaf=models.Subquery(latest))
+
+    def public_counts(self):
+        """The counts of new public comments, as from ``count_many``."""
+        return [key + (count,) for key, count in self.public.items()]
+
+
+class CommentCounterManager(models.Manager):
+    def get_counts(self, ctype, pks, site_id):
+        """
+        Dict mapping the given primary keys of objects of a
+        content type to their counts, for those that have a counter.
+        """
+        object_pks = {force_text(pk): pk for pk in pks}
+        return {
+            object_pks[object_pk]: count
+            for object_pk, count in self.get_queryset().filter(
+                content_type=ctype, object_pk__in=object_pks, site__pk=site_id
+            ).values_list('object_pk', 'count')
+        }
+
+    def track(self, comment, was_public):
+        """
+        Update the counter of the object of a comment if the comment has
+        become public or stopped being public. A comment is considered
+        public if it's marked as public and has not been removed.
+        """
+        from . import COMMENTS_USE_COUNTERS
+        is_public = getattr(comment, 'is_public', True) and \
+            not getattr(comment, 'is_removed', False)
+        if COMMENTS_USE_COUNTERS and is_public != was_public:
+            self.add(comment, 1 if is_public else -1)
+
+    def add(self, comment, delta):
+        """Atomically add ``delta`` to the counter of a comment's object."""
+        self._add(
+            comment.__class__._default_manager, delta,
+            content_type_id=comment.content_type_id,
+            object_pk=comment.object_pk, site_id=comment.site_id
+        )
+
+    def count_many(self, comment_queryset):
+        """
+        Count the comments of a queryset on each object, to be passed to
+        ``add_many`` once they have changed. Returns an empty list if
+        counters are disabled.
+        """
+        from . import COMMENTS_USE_COUNTERS
+        if not COMMENTS_USE_COUNTERS:
+            return []
+        return list(
+            comment_queryset.order_by()
+            .values_list('content_type', 'object_pk', 'site')
+            .annotate(models.Count('pk'))
+        )
+
+    def add_many(self, comment_model, counts, delta):
+        """
+        Add ``delta`` to the counters of objects once for each of
+        their comments, given the counts from ``count_many``.
+        """
+        for ct_id, object_pk, site_id, count in counts:
+            self._add(
+                comment_model._default_manager, delta * count,
+                content_type_id=ct_id, object_pk=object_pk, site_id=site_id
+            )
+
+    def _add(self, comment_manager, delta, **lookup):
+        qs = self.get_queryset().filter(**lookup)
+        if qs.update(count=Greatest(models.F('count') + delta, 0)):
+            return
+        # Count the comments the first time the counter is needed,
+        # so that it can be enabled without rebuilding the counters.
+        count = comment_manager.filter(
+            is_public=True, is_removed=False, **lookup
+        ).count()
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(count=count, **lookup)
+        except IntegrityError:
+            # The counter was created concurrently.
+            qs.update(count=Greatest(models.F('count') + delta, 0))
+
+    def rebuild(self, comment_queryset, batch_size=1000):
+        """
+        Rebuild all the counters from a queryset of comments.
+        Returns the number of counters that were created.
+        """
+        rows = comment_queryset.filter(is_public=True, is_removed=False) \
+            .order_by().values_list('content_type', 'object_pk', 'site') \
+            .annotate(models.Count('pk'))
+        with transaction.atomic(using=self.db):
+            self.get_queryset().delete()
+            counters = self.bulk_create((
+                self.model(
+                    content_type_id=ct_id, object_pk=object_pk,
+                    site_id=site_id, count=count
+                ) for ct_id, object_pk, site_id, count in rows.iterator()
+            ), batch_size=batch_size)
+        return len(counters)
+
+
+class CommentNotificationManager(models.Manager):
+    def queue(self, subject, message, from_email, recipient_list):
+        """Queue an email notification to be sent later."""
+        return self.create(
+            subject=subject, message=message, from_email=from_email,
+            recipients='\n'.join(recipient_list)
+        )
+
+    def send_batch(self, connection, batch_size=100):
+        """
+        Send a batch of queued notifications through a mail connection,
+        and delete them. Rows locked by other workers are skipped where
+        the database supports it. Returns the number of notifications sent.
+        """
+        features = connections[self.db].features
+        with transaction.atomic(using=self.db):
+            batch = list(self.select_for_update(
+                skip_locked=features.has_select_for_update_skip_locked
+            ).order_by('pk')[:batch_size])
+            if batch:
+                send_mass_mail((
+                    (n.subject, n.message, n.from_email, n.recipient_list)
+                    for n in batch
+                ), connection=connection)
+                self.filter(pk__in=[n.pk for n in batch]).delete()
+        return len(batch)
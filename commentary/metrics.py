@@ -0,0 +1,185 @@
+"""
+Instrumentation of the comment hot paths.
+
+The stages of posting a comment are timed and its outcomes are counted,
+and the measurements are emitted to the backend configured with the
+``COMMENTS_METRICS`` setting. Errors of the backend are logged instead
+of raised, so that a broken metrics sink can't break posting comments.
+"""
+import logging
+import socket
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from . import _get_setting
+
+DEFAULT_BACKEND = 'commentary.metrics.MemoryBackend'
+
+logger = logging.getLogger(__name__)
+
+# The configured backend, created on first use.
+_backend = []
+
+
+class BaseBackend(object):
+    """Base class of the metrics backends."""
+
+    def incr(self, name, value=1):
+        """Increment a counter."""
+        raise NotImplementedError
+
+    def timing(self, name, ms):
+        """Record the duration of a stage, in milliseconds."""
+        raise NotImplementedError
+
+
+class NullBackend(BaseBackend):
+    """Discard the measurements, e.g. if the backend can't be created."""
+
+    def incr(self, name, value=1):
+        pass
+
+    def timing(self, name, ms):
+        pass
+
+
+class MemoryBackend(BaseBackend):
+    """
+    Keep the counters and the last ``max_samples`` timings of
+    each stage in memory, e.g. to inspect them in tests or a shell.
+    """
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = defaultdict(int)
+            self.timings = defaultdict(
+                lambda: deque(maxlen=self.max_samples)
+            )
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def timing(self, name, ms):
+        with self._lock:
+            self.timings[name].append(ms)
+
+
+class LoggingBackend(BaseBackend):
+    """Log the measurements to the ``commentary.metrics`` logger."""
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def incr(self, name, value=1):
+        logger.log(self.level, '%s +%d', name, value)
+
+    def timing(self, name, ms):
+        logger.log(self.level, '%s %.3fms', name, ms)
+
+
+class StatsdBackend(BaseBackend):
+    """
+    Send the measurements to a statsd server over UDP. The address of the
+    server is resolved once, and each measurement is sent in one datagram.
+    """
+    def __init__(self, host='localhost', port=8125, prefix='commentary'):
+        family, _, _, _, self.address = socket.getaddrinfo(
+            host, port, type=socket.SOCK_DGRAM
+        )[0]
+        self.prefix = prefix + '.' if prefix else ''
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, metric):
+        try:
+            self.socket.sendto(
+                (self.prefix + metric).encode(), self.address
+            )
+        except OSError:
+            # The datagram is dropped, like any other lost UDP packet.
+            pass
+
+    def incr(self, name, value=1):
+        self.send('%s:%d|c' % (name, value))
+
+    def timing(self, name, ms):
+        self.send('%s:%.3f|ms' % (name, ms))
+
+
+def get_backend():
+    """Get the metrics backend configured with ``COMMENTS_METRICS``."""
+    try:
+        return _backend[0]
+    except IndexError:
+        pass
+    config = _get_setting('METRICS', {})
+    try:
+        backend_class = import_string(config.get('BACKEND', DEFAULT_BACKEND))
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            'Could not import the COMMENTS_METRICS backend: %s' % e
+        )
+    _backend.append(backend_class(**config.get('OPTIONS', {})))
+    return _backend[0]
+
+
+def reset_backend(**kwargs):
+    """
+    Clear the cached backend. This is called automatically
+    when the ``COMMENTS_METRICS`` setting is changed.
+    """
+    if kwargs.get('setting') in (None, 'COMMENTS_METRICS'):
+        del _backend[:]
+
+
+setting_changed.connect(reset_backend)
+
+
+def _get_backend():
+    """
+    Get the metrics backend, or a ``NullBackend`` in its place if it
+    can't be created. The error is logged once, until it's reset.
+    """
+    try:
+        return get_backend()
+    except Exception:
+        logger.exception('Could not create the metrics backend')
+        _backend.append(NullBackend())
+        return _backend[0]
+
+
+def incr(name, value=1):
+    """Increment a counter of the metrics backend."""
+    try:
+        _get_backend().incr(name, value)
+    except Exception:
+        logger.exception('Could not increment the %s counter', name)
+
+
+def timing(name, ms):
+    """Record the duration of a stage to the metrics backend."""
+    try:
+        _get_backend().timing(name, ms)
+    except Exception:
+        logger.exception('Could not record the %s timing', name)
+
+
+@contextmanager
+def timer(name):
+    """Time the enclosed block as the stage ``name``."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timing(name, (perf_counter() - start) * 1000)
@@ -0,0 +1,106 @@
+import re
+from itertools import islice
+
+from django.core.validators import RegexValidator
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+NODE_WIDTH = 7
+
+NODE_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def encode_node(pk):
+    node = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        node = NODE_DIGITS[digit] + node
+    return node.rjust(NODE_WIDTH, '0')
+
+
+def set_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('commentary', 'Comment')
+    rows = Comment.objects.order_by('pk').values_list('id', 'parent_id') \
+        .iterator(chunk_size=BATCH_SIZE)
+    # The comments whose parent has not been updated yet because it
+    # comes later in primary key order, by parent, and their ids.
+    waiting, waiting_pks = {}, set()
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        # The new paths of the parents updated by the previous batches.
+        paths = dict(Comment.objects.filter(pk__in=[
+            parent_id for _, parent_id in batch
+            if parent_id is not None and parent_id < batch[0][0] and
+            parent_id not in waiting_pks
+        ]).values_list('id', 'path'))
+        comments = []
+        for pk, parent_id in batch:
+            if parent_id is None:
+                path = encode_node(pk)
+            elif parent_id in paths:
+                path = '%s/%s' % (paths[parent_id], encode_node(pk))
+            else:
+                waiting.setdefault(parent_id, []).append(pk)
+                waiting_pks.add(pk)
+                continue
+            # Update the comment along with the replies waiting for it.
+            stack = [(pk, path)]
+            while stack:
+                node, node_path = stack.pop()
+                paths[node] = node_path
+                waiting_pks.discard(node)
+                comments.append(Comment(id=node, path=node_path))
+                stack.extend(
+                    (reply, '%s/%s' % (node_path, encode_node(reply)))
+                    for reply in waiting.pop(node, ())
+                )
+        Comment.objects.bulk_update(
+            comments, ('path',), batch_size=BATCH_SIZE
+        )
+
+
+def unset_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('commentary', 'Comment')
+    # The paths are read by primary key ranges rather than from one
+    # iterator, which could see the paths that were already updated.
+    last_pk = None
+    while True:
+        rows = Comment.objects.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        comments = [
+            Comment(id=pk, path='/'.join(
+                str(int(node, 36)) for node in path.split('/')
+            )) for pk, path in rows.values_list('id', 'path')[:BATCH_SIZE]
+        ]
+        if not comments:
+            break
+        Comment.objects.bulk_update(comments, ('path',))
+        last_pk = comments[-1].pk
+
+
+comment_path_validator = RegexValidator(
+    re.compile(r'^[0-9a-z]{7}(?:/[0-9a-z]{7})*\Z'), code='invalid',
+    message='Invalid comment tree path'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentary', '0005_add_db_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_comment_paths, unset_comment_paths),
+        migrations.AlterField(
+            model_name='comment', name='path',
+            field=models.TextField(
+                db_index=True, editable=False,
+                validators=(comment_path_validator,), verbose_name='tree path',
+            ),
+        ),
+    ]
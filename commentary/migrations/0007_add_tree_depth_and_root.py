@@ -0,0 +1,48 @@
+from itertools import islice
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def set_depths_and_roots(apps, schema_editor):
+    Comment = apps.get_model('commentary', 'Comment')
+    rows = Comment.objects.values_list('id', 'path').order_by() \
+        .iterator(chunk_size=BATCH_SIZE)
+    # bulk_update() evaluates its objects at once,
+    # so they are updated one batch at a time.
+    while True:
+        comments = [
+            Comment(
+                id=pk, depth=path.count('/') + 1, root_id=int(path[:7], 36)
+            ) for pk, path in islice(rows, BATCH_SIZE)
+        ]
+        if not comments:
+            break
+        Comment.objects.bulk_update(comments, ('depth', 'root'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentary', '0006_encode_comment_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment', name='depth',
+            field=models.PositiveSmallIntegerField(
+                db_index=True, default=1,
+                editable=False, verbose_name='tree depth'
+            ),
+        ),
+        migrations.AddField(
+            model_name='comment', name='root',
+            field=models.ForeignKey(
+                blank=True, editable=False, null=True,
+                on_delete=models.deletion.CASCADE, related_name='+',
+                to='commentary.Comment', verbose_name='tree root'
+            ),
+        ),
+        migrations.RunPython(set_depths_and_roots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0002_alter_domain_unique'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('commentary', '0007_add_tree_depth_and_root'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentCounter',
+            fields=[
+                ('id', models.AutoField(
+                    verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True
+                )),
+                ('object_pk', models.CharField(
+                    max_length=64, verbose_name='object ID'
+                )),
+                ('count', models.PositiveIntegerField(
+                    default=0, verbose_name='count'
+                )),
+                ('content_type', models.ForeignKey(
+                    on_delete=models.deletion.CASCADE, related_name='+',
+                    to='contenttypes.ContentType', verbose_name='content type'
+                )),
+                ('site', models.ForeignKey(
+                    on_delete=models.deletion.CASCADE,
+                    related_name='+', to='sites.Site'
+                )),
+            ],
+            options={
+                'verbose_name': 'comment counter',
+                'verbose_name_plural': 'comment counters',
+                'unique_together': {('content_type', 'object_pk', 'site')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentary', '0008_add_comment_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment', name='body_html',
+            field=models.TextField(
+                editable=False, null=True, verbose_name='rendered comment'
+            ),
+        ),
+        migrations.AddField(
+            model_name='comment', name='body_text',
+            field=models.TextField(
+                editable=False, null=True, verbose_name='comment text'
+            ),
+        ),
+    ]
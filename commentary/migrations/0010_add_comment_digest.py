@@ -0,0 +1,50 @@
+from hashlib import md5
+from itertools import islice
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def make_digest(body, user_id, content_type_id, object_pk):
+    value = '\0'.join((
+        ' '.join(body.split()), str(user_id or ''),
+        str(content_type_id), str(object_pk)
+    ))
+    return md5(value.encode()).hexdigest()
+
+
+def set_comment_digests(apps, schema_editor):
+    Comment = apps.get_model('commentary', 'Comment')
+    rows = Comment.objects.values_list(
+        'id', 'body', 'user_id', 'content_type_id', 'object_pk'
+    ).order_by().iterator(chunk_size=BATCH_SIZE)
+    # bulk_update() evaluates its objects at once,
+    # so only one batch of bodies is kept in memory.
+    while True:
+        comments = [
+            Comment(id=pk, digest=make_digest(*values))
+            for pk, *values in islice(rows, BATCH_SIZE)
+        ]
+        if not comments:
+            break
+        Comment.objects.bulk_update(comments, ('digest',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentary', '0009_add_rendered_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment', name='digest',
+            field=models.CharField(
+                db_index=True, default='', editable=False,
+                max_length=32, verbose_name='digest'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_comment_digests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commentary', '0010_add_comment_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentNotification',
+            fields=[
+                ('id', models.AutoField(
+                    verbose_name='ID', serialize=False,
+                    auto_created=True, primary_key=True
+                )),
+                ('subject', models.TextField(verbose_name='subject')),
+                ('message', models.TextField(verbose_name='message')),
+                ('from_email', models.CharField(
+                    max_length=254, verbose_name='from'
+                )),
+                ('recipients', models.TextField(verbose_name='recipients')),
+                ('created', models.DateTimeField(
+                    auto_now_add=True, verbose_name='date created'
+                )),
+            ],
+            options={
+                'verbose_name': 'comment notification',
+                'verbose_name_plural': 'comment notifications',
+            },
+        ),
+    ]
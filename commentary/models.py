@@ -1,9 +1,12 @@
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from . import get_user_display
 from .abstracts import CommentAbstractModel
+from .managers import CommentCounterManager, CommentNotificationManager
 
 
 class Comment(CommentAbstractModel):
@@ -56,3 +59,61 @@ class CommentFlag(models.Model):
         return '%s flag of comment ID %s by %s' % (
             self.flag, self.comment_id, get_user_display(self.user)
         )
+
+
+class CommentCounter(models.Model):
+    """
+    Keeps count of the public comments which have not been removed on
+    each object. Only maintained if ``COMMENTS_USE_COUNTERS`` is enabled.
+    """
+    content_type = models.ForeignKey(
+        ContentType, verbose_name=_('content type'),
+        related_name='+', on_delete=models.CASCADE
+    )
+    object_pk = models.CharField(_('object ID'), max_length=64)
+    site = models.ForeignKey(
+        Site, related_name='+', on_delete=models.CASCADE
+    )
+    count = models.PositiveIntegerField(_('count'), default=0)
+
+    # Manager
+    objects = CommentCounterManager()
+
+    class Meta:
+        unique_together = (
+            ('content_type', 'object_pk', 'site'),
+        )
+        verbose_name = _('comment counter')
+        verbose_name_plural = _('comment counters')
+
+    def __str__(self):
+        return '%s comments on %s %s' % (
+            self.count, self.content_type, self.object_pk
+        )
+
+
+class CommentNotification(models.Model):
+    """
+    An email notification about a comment, saved in the same transaction
+    as the comment and sent later by the ``process_comment_outbox``
+    command. Only used if ``COMMENTS_USE_OUTBOX`` is enabled.
+    """
+    subject = models.TextField(_('subject'))
+    message = models.TextField(_('message'))
+    from_email = models.CharField(_('from'), max_length=254)
+    recipients = models.TextField(_('recipients'))
+    created = models.DateTimeField(_('date created'), auto_now_add=True)
+
+    # Manager
+    objects = CommentNotificationManager()
+
+    class Meta:
+        verbose_name = _('comment notification')
+        verbose_name_plural = _('comment notifications')
+
+    def __str__(self):
+        return self.subject
+
+    @property
+    def recipient_list(self):
+        return self.recipients.split('\n')
@@ -64,7 +64,7 @@ from django.template import loader
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from . import get_model, signals
+from . import get_model, metrics, signals
 
 
 class AlreadyModerated(Exception):
@@ -240,7 +240,8 @@ class CommentModerator(object):
     def email(self, comment, content_object, request):
         """
         Send email notification of a new comment to site staff when email
-        notifications have been requested.
+        notifications have been requested. If ``COMMENTS_USE_OUTBOX`` is
+        enabled, the email is queued instead of being sent right away.
 
         """
         if not self.email_notification:
@@ -255,10 +256,19 @@ class CommentModerator(object):
             'comment': comment,
             'content_object': content_object,
         })
-        send_mail(
-            subject, message, settings.DEFAULT_FROM_EMAIL,
-            recipient_list, fail_silently=True
-        )
+        from . import COMMENTS_USE_OUTBOX
+        if COMMENTS_USE_OUTBOX:
+            from .models import CommentNotification
+            if recipient_list:
+                CommentNotification.objects.queue(
+                    subject, message, settings.DEFAULT_FROM_EMAIL,
+                    recipient_list
+                )
+        else:
+            send_mail(
+                subject, message, settings.DEFAULT_FROM_EMAIL,
+                recipient_list, fail_silently=True
+            )
 
 
 class Moderator(object):
@@ -343,21 +353,40 @@ class Moderator(object):
                 raise NotModerated(err % model._meta.model_name)
             del self._registry[model]
 
+    def _get_moderation(self, comment, content_object=None):
+        """
+        Get the moderation class and content object of a comment, using
+        the object sent with the signal if any to avoid fetching it again.
+        Returns ``(None, None)`` if the model isn't moderated.
+
+        """
+        if content_object is not None:
+            # Like the content type, a proxy resolves to its concrete model.
+            model = content_object._meta.concrete_model
+        else:
+            model = comment.content_type.model_class()
+        if model not in self._registry:
+            return None, None
+        if content_object is None:
+            content_object = comment.content_object
+        return self._registry[model], content_object
+
     def pre_save_moderation(self, sender, comment, request, **kwargs):
         """
         Apply any necessary pre-save moderation steps to new
         comments.
 
         """
-        model = comment.content_type.model_class()
-        if model not in self._registry:
+        moderation_class, content_object = self._get_moderation(
+            comment, kwargs.get('content_object')
+        )
+        if moderation_class is None:
             return
-        content_object = comment.content_object
-        moderation_class = self._registry[model]
         # Comment will be disallowed outright (HTTP 403 response)
         if not moderation_class.allow(comment, content_object, request):
             return False
         if moderation_class.moderate(comment, content_object, request):
+            metrics.incr('post_comment.moderated')
             comment.is_public = False
 
     def post_save_moderation(self, sender, comment, request, **kwargs):
@@ -366,10 +395,13 @@ class Moderator(object):
         comments.
 
         """
-        model = comment.content_type.model_class()
-        if model not in self._registry:
+        moderation_class, content_object = self._get_moderation(
+            comment, kwargs.get('content_object')
+        )
+        if moderation_class is None:
             return
-        self._registry[model].email(comment, comment.content_object, request)
+        with metrics.timer('post_comment.moderation_email'):
+            moderation_class.email(comment, content_object, request)
 
 
 # Import this instance in your own code to use in registering
@@ -0,0 +1,93 @@
+"""
+Keyset pagination of comments.
+
+Instead of skipping a number of rows, each page is fetched by seeking
+past the position of the last comment of the previous page, which is
+encoded in an opaque cursor. This way, every page costs the same as
+the first one.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class CommentPage(list):
+    """
+    A page of comments. ``next_cursor`` is the cursor of the
+    next page, or ``None`` if this is the last page.
+    """
+    def __init__(self, comments, next_cursor=None):
+        super(CommentPage, self).__init__(comments)
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _has_path(model):
+    return any(f.name == 'path' for f in model._meta.fields)
+
+
+def encode_cursor(comment):
+    """Encode the position of a comment into an opaque cursor."""
+    if hasattr(comment, 'path'):
+        key = [comment.path]
+    else:
+        key = [comment.submit_date.isoformat(), comment.pk]
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into the list of values it was made of.
+    Raises ``ValueError`` if the cursor is malformed.
+    """
+    try:
+        key = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+    except (BinasciiError, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor: %r' % cursor)
+    if not isinstance(key, list) or len(key) not in (1, 2):
+        raise ValueError('Invalid cursor: %r' % cursor)
+    return key
+
+
+def get_page(queryset, page_size, after=None, fetch=list):
+    """
+    Get the page of ``page_size`` comments of a queryset following the
+    given cursor, ordered by tree path if the comment model has one
+    and by submission date otherwise. The comments are fetched from
+    the sliced queryset by the ``fetch`` function. Raises ``ValueError``
+    if the page size isn't positive or the cursor is invalid.
+    """
+    if page_size < 1:
+        raise ValueError('Invalid page size: %r' % page_size)
+    if _has_path(queryset.model):
+        queryset = queryset.order_by('path')
+        if after:
+            path, = decode_cursor(after)
+            if not isinstance(path, str):
+                raise ValueError('Invalid cursor: %r' % after)
+            queryset = queryset.filter(path__gt=path)
+    else:
+        queryset = queryset.order_by('submit_date', 'pk')
+        if after:
+            submit_date, pk = decode_cursor(after)
+            if not isinstance(submit_date, str) or \
+                    not isinstance(pk, (int, str)):
+                raise ValueError('Invalid cursor: %r' % after)
+            submit_date = parse_datetime(submit_date)
+            if submit_date is None:
+                raise ValueError('Invalid cursor: %r' % after)
+            queryset = queryset.filter(
+                Q(submit_date__gt=submit_date) |
+                Q(submit_date=submit_date, pk__gt=pk)
+            )
+    comments = fetch(queryset[:page_size + 1])
+    if len(comments) <= page_size:
+        return CommentPage(comments)
+    del comments[page_size:]
+    return CommentPage(comments, encode_cursor(comments[-1]))
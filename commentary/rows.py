@@ -0,0 +1,109 @@
+"""
+Lightweight read-only comments.
+
+Rendering a long list of comments only needs a few of their columns, so
+instead of model instances, comments can be fetched as ``CommentRow``
+objects built from ``values()``, which are much cheaper to create.
+"""
+from django.contrib.auth import get_user_model
+
+from . import (
+    _get_hook, attach_user_displays, get_user_display, reverse_comment_url,
+)
+
+
+class CommentRow(object):
+    """
+    A read-only comment, exposing the same attributes
+    and methods as the comment model used by templates.
+    """
+    __slots__ = (
+        'id', 'content_type_id', 'object_pk', 'site_id', 'user_id',
+        'parent_id', 'path', 'depth', 'body', 'body_html', 'body_text',
+        'submit_date', 'edit_date', 'is_public', 'is_removed', 'user',
+        '_user_display'
+    )
+
+    #: The fields of the comment model that are fetched.
+    fields = __slots__[:-2]
+
+    def __init__(self, user=None, **values):
+        for field in self.fields:
+            setattr(self, field, values[field])
+        self.user = user
+
+    def __repr__(self):
+        return '<CommentRow: %s>' % self.id
+
+    def __eq__(self, other):
+        return isinstance(other, CommentRow) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_edited(self):
+        """Check whether this comment has been edited."""
+        return self.submit_date != self.edit_date
+
+    @property
+    def user_display(self):
+        """Display the full name/username of the commenter."""
+        try:
+            return self._user_display
+        except AttributeError:
+            return get_user_display(self.user) if self.user else ''
+
+    @user_display.setter
+    def user_display(self, value):
+        self._user_display = value
+
+    def get_content_object_url(self):
+        """
+        Get a URL suitable for redirecting to the content object.
+        """
+        return reverse_comment_url(
+            'comments-url-redirect', self.content_type_id, self.object_pk
+        )
+
+    def get_absolute_url(self, anchor_pattern='#c%(id)s'):
+        values = {field: getattr(self, field) for field in self.fields}
+        return self.get_content_object_url() + (anchor_pattern % values)
+
+
+def supports_rows(model):
+    """Check whether the comments of a model can be fetched as rows."""
+    attnames = {f.attname for f in model._meta.concrete_fields}
+    return attnames.issuperset(CommentRow.fields)
+
+
+def _user_fields(user_model):
+    """Get the fields of users that their default display name needs."""
+    names = {user_model.USERNAME_FIELD, 'first_name', 'last_name'}
+    return [
+        f.name for f in user_model._meta.concrete_fields if f.name in names
+    ]
+
+
+def fetch_rows(queryset):
+    """
+    Fetch a queryset of comments as a list of rows. The users of the
+    comments are fetched with a single extra query, with only the
+    fields of their names unless a custom display hook may need
+    others, and their display names are attached to the rows.
+    """
+    values = list(queryset.values(*CommentRow.fields))
+    user_ids = {v['user_id'] for v in values if v['user_id'] is not None}
+    user_model = get_user_model()
+    users = user_model._default_manager.all()
+    if _get_hook('get_user_displays') is None and \
+            _get_hook('get_user_display') is None:
+        users = users.only(*_user_fields(user_model))
+    users = users.in_bulk(user_ids) if user_ids else {}
+    return attach_user_displays([
+        CommentRow(user=users.get(v['user_id']), **v) for v in values
+    ])
@@ -9,12 +9,12 @@ from django.dispatch import Signal
 # be discarded and a 400 response. This signal is sent at more or less
 # the same time (just before, actually) as the Comment object's pre-save signal,
 # except that the HTTP request is sent along with this signal.
-# Arguments: "comment", "request"
+# Arguments: "comment", "request", "content_object"
 comment_will_be_posted = Signal()
 
 # Sent just after a comment was posted. See above for how this differs
 # from the Comment object's post-save signal.
-# Arguments: "comment", "request"
+# Arguments: "comment", "request", "content_object"
 comment_was_posted = Signal()
 
 # Sent after a comment was "flagged" in some way. Check the flag to see if this
@@ -22,3 +22,8 @@ comment_was_posted = Signal()
 # comment, or some other custom user flag.
 # Arguments: "comment", "flag", "created", "request"
 comment_was_flagged = Signal()
+
+# Sent once after many comments were flagged at once by a bulk action, such
+# as the admin actions, instead of sending comment_was_flagged for each one.
+# Arguments: "comment_ids", "flag", "request"
+comments_were_flagged = Signal()
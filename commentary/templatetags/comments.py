@@ -1,12 +1,21 @@
 from django import template
-from django.template.loader import render_to_string
+from django.core.cache import caches
+from django.template.loader import render_to_string, select_template
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
 from django.utils.encoding import smart_text
+from django.utils.functional import cached_property
 from django.utils.html import linebreaks, mark_safe
 
 import commentary
+from commentary.abstracts import CommentAbstractModel
+from commentary.cache import list_cache_key
+from commentary.managers import (
+    count_by_object, count_public_by_object, with_user_displays
+)
+from commentary.pagination import get_page
+from commentary.rows import fetch_rows, supports_rows
 
 register = template.Library()
 
@@ -23,7 +32,14 @@ class BaseCommentNode(template.Node):
         """
         Class method to parse get_comment_list/count/form and return a Node.
         """
-        tokens = token.split_contents()
+        return cls.handle_tokens(parser, token.split_contents())
+
+    @classmethod
+    def handle_tokens(cls, parser, tokens, **kwargs):
+        """
+        Return a Node from the split contents of a get_comment_* tag,
+        passing any extra keyword arguments to the Node.
+        """
         if tokens[1] != 'for':
             raise template.TemplateSyntaxError(
                 "Second argument in %r tag must be 'for'" % tokens[0]
@@ -37,7 +53,7 @@ class BaseCommentNode(template.Node):
                 )
             return cls(
                 object_expr=parser.compile_filter(tokens[2]),
-                as_varname=tokens[4],
+                as_varname=tokens[4], **kwargs
             )
 
         # {% get_whatever for app.model pk as varname %}
@@ -49,7 +65,7 @@ class BaseCommentNode(template.Node):
             return cls(
                 ctype=BaseCommentNode.lookup_content_type(tokens[2], tokens[0]),
                 object_pk_expr=parser.compile_filter(tokens[3]),
-                as_varname=tokens[5]
+                as_varname=tokens[5], **kwargs
             )
 
         else:
@@ -98,31 +114,66 @@ class BaseCommentNode(template.Node):
         if not object_pk:
             return self.comment_model.objects.none()
 
-        # Explicit SITE_ID takes precedence over request. This is also how
-        # get_current_site operates.
-        site_id = getattr(settings, 'SITE_ID', None)
-        if not site_id and ('request' in context):
-            site_id = get_current_site(context['request']).pk
+        qs = self.filter_queryset(context, self.comment_model.objects.filter(
+            content_type=ctype, object_pk=smart_text(object_pk),
+        ))
+        if 'user' in self.field_names:
+            qs = qs.select_related('user')
+        return qs
 
-        qs = self.comment_model.objects.filter(
-            content_type=ctype,
-            object_pk=smart_text(object_pk),
-            site__pk=site_id,
-        )
+    def filter_queryset(self, context, qs):
+        """Filter out the comments that should not be displayed."""
+        qs = qs.filter(site__pk=self.get_site_id(context))
 
         # The is_public and is_removed fields are implementation details of the
         # built-in comment model's spam filtering system, so they might not
         # be present on a custom comment model subclass. If they exist, we
         # should filter on them.
-        field_names = [f.name for f in self.comment_model._meta.fields]
-        if 'is_public' in field_names:
+        if 'is_public' in self.field_names:
             qs = qs.filter(is_public=True)
-        if commentary.COMMENTS_HIDE_REMOVED and 'is_removed' in field_names:
+        if commentary.COMMENTS_HIDE_REMOVED and \
+                'is_removed' in self.field_names:
             qs = qs.filter(is_removed=False)
-        if 'user' in field_names:
-            qs = qs.select_related('user')
         return qs
 
+    def get_site_id(self, context):
+        # Explicit SITE_ID takes precedence over request. This is also how
+        # get_current_site operates.
+        site_id = getattr(settings, 'SITE_ID', None)
+        if not site_id and ('request' in context):
+            site_id = get_current_site(context['request']).pk
+        return site_id
+
+    @cached_property
+    def field_names(self):
+        return {f.name for f in self.comment_model._meta.fields}
+
+    @property
+    def use_rows(self):
+        """Whether comments should be fetched as lightweight rows."""
+        return commentary.COMMENTS_USE_ROWS and \
+            supports_rows(self.comment_model)
+
+    def fetch(self, qs):
+        """
+        Fetch the comments of a queryset for rendering, along
+        with the display names of their users when possible.
+        """
+        if self.use_rows:
+            return fetch_rows(qs)
+        if not issubclass(self.comment_model, CommentAbstractModel):
+            return list(qs)
+        return commentary.attach_user_displays(
+            list(qs.select_related('user'))
+        )
+
+    @property
+    def use_counters(self):
+        """Whether counts can be read from the comment counters."""
+        return commentary.COMMENTS_USE_COUNTERS and \
+            commentary.COMMENTS_HIDE_REMOVED and \
+            {'is_public', 'is_removed'} <= self.field_names
+
     def get_target_ctype_pk(self, context):
         if self.object_expr:
             try:
@@ -143,15 +194,137 @@ class BaseCommentNode(template.Node):
 class CommentListNode(BaseCommentNode):
     """Insert a list of comments into the context."""
 
+    @classmethod
+    def handle_token(cls, parser, token):
+        """
+        Class method to parse get_comment_list and return a Node,
+        with optional ``page_size`` and ``after`` arguments.
+        """
+        tokens = token.split_contents()
+        kwargs = {}
+        while len(tokens) > 5 and tokens[-2] in ('page_size', 'after'):
+            option = tokens[-2] + '_expr'
+            if option in kwargs:
+                raise template.TemplateSyntaxError(
+                    "%r tag received %r more than once" % (
+                        tokens[0], tokens[-2]
+                    )
+                )
+            kwargs[option] = parser.compile_filter(tokens[-1])
+            del tokens[-2:]
+        if 'after_expr' in kwargs and 'page_size_expr' not in kwargs:
+            raise template.TemplateSyntaxError(
+                "%r tag requires 'page_size' when given 'after'" % tokens[0]
+            )
+        return cls.handle_tokens(parser, tokens, **kwargs)
+
+    def __init__(self, page_size_expr=None, after_expr=None, **kwargs):
+        super(CommentListNode, self).__init__(**kwargs)
+        self.page_size_expr = page_size_expr
+        self.after_expr = after_expr
+
     def get_context_value_from_queryset(self, context, qs):
-        return qs
+        if self.page_size_expr is None:
+            if self.use_rows:
+                return fetch_rows(qs)
+            if not issubclass(self.comment_model, CommentAbstractModel):
+                return qs
+            # Keep the queryset lazy, so that it can still be filtered.
+            return with_user_displays(qs.select_related('user'))
+        try:
+            page_size = int(self.page_size_expr.resolve(context))
+        except (TypeError, ValueError):
+            page_size = None
+        if page_size is None or page_size < 1:
+            raise template.TemplateSyntaxError(
+                "'get_comment_list' tag requires a positive page_size"
+            )
+        after = None
+        if self.after_expr is not None:
+            after = self.after_expr.resolve(context, ignore_failures=True)
+        try:
+            return get_page(qs, page_size, after, self.fetch)
+        except ValueError:
+            # Start over from the first page if the cursor is invalid.
+            return get_page(qs, page_size, fetch=self.fetch)
+
+
+class TreeNode(object):
+    """A comment along with a list of the tree nodes of its replies."""
+    __slots__ = ('comment', 'replies')
+
+    def __init__(self, comment):
+        self.comment = comment
+        self.replies = []
+
+    def __repr__(self):
+        return '<TreeNode: %r>' % self.comment
+
+
+def build_comment_tree(comments):
+    """
+    Build a list of tree nodes out of an iterable of comments ordered by
+    their tree path, in a single pass. Comments whose parent is not in
+    the iterable (e.g. because it was removed) are treated as top level.
+    """
+    nodes, tree = {}, []
+    for comment in comments:
+        node = nodes[comment.pk] = TreeNode(comment)
+        parent = nodes.get(comment.parent_id)
+        if parent is None:
+            tree.append(node)
+        else:
+            parent.replies.append(node)
+    return tree
+
+
+class CommentTreeNode(BaseCommentNode):
+    """Insert a tree of comments into the context."""
+
+    def get_context_value_from_queryset(self, context, qs):
+        return build_comment_tree(self.fetch(qs))
 
 
 class CommentCountNode(BaseCommentNode):
     """Insert a count of comments into the context."""
 
     def get_context_value_from_queryset(self, context, qs):
-        return qs.count()
+        ctype, object_pk = self.get_target_ctype_pk(context)
+        if not object_pk or not self.use_counters:
+            return qs.count()
+        return count_public_by_object(
+            qs, ctype, [object_pk], self.get_site_id(context)
+        )[object_pk]
+
+
+class CommentCountsNode(BaseCommentNode):
+    """Insert the comment counts of a list of objects into the context."""
+
+    def render(self, context):
+        if self.object_expr:
+            try:
+                objects = list(self.object_expr.resolve(context))
+            except template.VariableDoesNotExist:
+                objects = []
+            ctype = ContentType.objects.get_for_model(objects[0]) \
+                if objects else None
+            pks = [obj.pk for obj in objects]
+        else:
+            ctype = self.ctype
+            objects = pks = list(self.object_pk_expr.resolve(
+                context, ignore_failures=True
+            ) or [])
+        qs = self.filter_queryset(context, self.comment_model.objects.all())
+        if self.use_counters:
+            counts = count_public_by_object(
+                qs, ctype, pks, self.get_site_id(context)
+            )
+        else:
+            counts = count_by_object(qs, ctype, pks)
+        context[self.as_varname] = [
+            (obj, counts[pk]) for obj, pk in zip(objects, pks)
+        ]
+        return ''
 
 
 class CommentFormNode(BaseCommentNode):
@@ -251,15 +424,29 @@ class RenderCommentListNode(CommentListNode):
                 "comments/%s/list.html" % ctype.app_label,
                 "comments/list.html"
             ]
-            qs = self.get_queryset(context)
-            context_dict = context.flatten()
-            context_dict['comment_list'] = \
-                self.get_context_value_from_queryset(context, qs)
-            liststr = render_to_string(template_search_list, context_dict)
+            template = select_template(template_search_list)
+            if commentary.COMMENTS_CACHE is None:
+                return self.render_list(context, template)
+            key = list_cache_key(
+                ctype.pk, object_pk, self.get_site_id(context),
+                template.origin.template_name
+            )
+            cache = caches[commentary.COMMENTS_CACHE]
+            liststr = cache.get(key)
+            if liststr is None:
+                liststr = self.render_list(context, template)
+                cache.set(key, liststr)
             return liststr
         else:
             return ''
 
+    def render_list(self, context, template):
+        qs = self.get_queryset(context)
+        context_dict = context.flatten()
+        context_dict['comment_list'] = \
+            self.get_context_value_from_queryset(context, qs)
+        return template.render(context_dict)
+
 
 # We could just register each classmethod directly, but then we'd lose out on
 # the automagic docstrings-into-admin-docs tricks. So each node gets a cute
@@ -287,6 +474,30 @@ def get_comment_count(parser, token):
     return CommentCountNode.handle_token(parser, token)
 
 
+@register.tag
+def get_comment_counts(parser, token):
+    """
+    Gets the comment counts for a list of objects of the same model in a
+    single query and populates the template context with a variable
+    containing a list of ``(object, count)`` pairs, whose name is defined
+    by the 'as' clause.
+
+    Syntax::
+
+        {% get_comment_counts for [object_list] as [varname]  %}
+        {% get_comment_counts for [app].[model] [id_list] as [varname]  %}
+
+    Example usage::
+
+        {% get_comment_counts for chapters as chapter_counts %}
+        {% for chapter, comment_count in chapter_counts %}
+            ...
+        {% endfor %}
+
+    """
+    return CommentCountsNode.handle_token(parser, token)
+
+
 @register.tag
 def get_comment_list(parser, token):
     """
@@ -298,6 +509,8 @@ def get_comment_list(parser, token):
 
         {% get_comment_list for [object] as [varname]  %}
         {% get_comment_list for [app].[model] [object_id] as [varname]  %}
+        {% get_comment_list for [object] as [varname] page_size [n] %}
+        {% get_comment_list ... page_size [n] after [cursor] %}
 
     Example usage::
 
@@ -306,10 +519,46 @@ def get_comment_list(parser, token):
             ...
         {% endfor %}
 
+    With ``page_size``, only one page of comments is returned, following
+    the comment of the (opaque) ``after`` cursor if it's given. The cursor
+    of the next page is available as ``next_cursor``::
+
+        {% get_comment_list for event as comments page_size 50 after cursor %}
+        {% if comments.has_next %}
+            <a href="?after={{ comments.next_cursor }}">More</a>
+        {% endif %}
+
     """
     return CommentListNode.handle_token(parser, token)
 
 
+@register.tag
+def get_comment_tree(parser, token):
+    """
+    Gets the comments for the given params as a list of top level tree
+    nodes and populates the template context with a variable containing
+    that value, whose name is defined by the 'as' clause. Each node has a
+    ``comment`` attribute and a ``replies`` list of nodes.
+
+    Syntax::
+
+        {% get_comment_tree for [object] as [varname]  %}
+        {% get_comment_tree for [app].[model] [object_id] as [varname]  %}
+
+    Example usage::
+
+        {% get_comment_tree for event as comment_tree %}
+        {% for node in comment_tree %}
+            {{ node.comment.body }}
+            {% for reply in node.replies %}
+                ...
+            {% endfor %}
+        {% endfor %}
+
+    """
+    return CommentTreeNode.handle_token(parser, token)
+
+
 @register.tag
 def render_comment_list(parser, token):
     """
@@ -386,10 +635,19 @@ def get_comment_permalink(comment, anchor_pattern=None):
 @register.filter
 def safe_comment(comment):
     """
-    If ``COMMENTS_ALLOW_HTML`` is True, mark the comment as safe.
-    Otherwise, strip any HTML tags.
+    Render a comment, or the body of a comment. The ``body_html``
+    rendered when the comment was saved is used if it was rendered
+    with the current ``COMMENTS_ALLOW_HTML``. Otherwise, if that is
+    True, mark the comment as safe, and if not, escape any HTML tags.
     """
+    body_html = getattr(comment, 'body_html', None)
+    # The body_text is only rendered if HTML was allowed.
+    allowed_html = getattr(comment, 'body_text', None) is not None
+    if body_html is not None and \
+            allowed_html == commentary.COMMENTS_ALLOW_HTML:
+        return mark_safe(body_html)
+    comment = getattr(comment, 'body', comment)
     if commentary.COMMENTS_ALLOW_HTML:
         return mark_safe(linebreaks(comment))
     else:
-        return linebreaks(comment, autoescape=True)
+        return mark_safe(linebreaks(comment, autoescape=True))
@@ -5,12 +5,13 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.sites.shortcuts import get_current_site
 from django.contrib.messages import error
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils.html import escape
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
 
-from commentary import get_form, signals
+from commentary import get_form, metrics, models, signals
 
 
 class CommentPostBadRequest(http.HttpResponseBadRequest):
@@ -36,74 +37,112 @@ def post_comment(request, next=None, using=None):
     ctype = request.POST.get('content_type')
     object_pk = request.POST.get('object_pk')
     if ctype is None or object_pk is None:
+        metrics.incr('post_comment.bad_request')
         return CommentPostBadRequest('Missing content_type or object_pk field.')
-    try:
-        model = apps.get_model(*ctype.split('.', 1))
-        target = model._default_manager.using(using).get(pk=object_pk)
-    except TypeError:
-        return CommentPostBadRequest(
-            'Invalid content_type value: %r' % escape(ctype)
-        )
-    except AttributeError:
-        return CommentPostBadRequest(
-            'The given content-type %r does not '
-            'resolve to a valid model.' % escape(ctype)
-        )
-    except ObjectDoesNotExist:
-        return CommentPostBadRequest(
-            'No object matching content-type %r and '
-            'object PK %r exists.' % (
-                escape(ctype), escape(object_pk)
+    with metrics.timer('post_comment.target'):
+        try:
+            model = apps.get_model(*ctype.split('.', 1))
+            target = model._default_manager.using(using).get(pk=object_pk)
+        except TypeError:
+            why = 'Invalid content_type value: %r' % escape(ctype)
+        except AttributeError:
+            why = (
+                'The given content-type %r does not '
+                'resolve to a valid model.' % escape(ctype)
             )
-        )
-    except (ValueError, ValidationError) as e:
-        return CommentPostBadRequest(
-            'Attempting to get content-type %r '
-            'and object PK %r raised %s' % (
-                escape(ctype), escape(object_pk), e.__class__.__name__
+        except ObjectDoesNotExist:
+            why = (
+                'No object matching content-type %r and '
+                'object PK %r exists.' % (
+                    escape(ctype), escape(object_pk)
+                )
             )
-        )
+        except (ValueError, ValidationError) as e:
+            why = (
+                'Attempting to get content-type %r '
+                'and object PK %r raised %s' % (
+                    escape(ctype), escape(object_pk), e.__class__.__name__
+                )
+            )
+        else:
+            why = None
+    if why is not None:
+        metrics.incr('post_comment.bad_request')
+        return CommentPostBadRequest(why)
 
-    # Construct the comment form
-    form = get_form()(target, data=request.POST)
+    # Construct and validate the comment form
+    with metrics.timer('post_comment.form'):
+        form = get_form()(target, data=request.POST)
+        security_errors = form.security_errors
 
     # Check security information
-    if form.security_errors:
+    if security_errors:
+        metrics.incr(
+            'post_comment.honeypot' if 'honeypot' in security_errors
+            else 'post_comment.security_failed'
+        )
         return CommentPostBadRequest(
             'The comment form failed security verification: %s' % escape(
-                str(form.security_errors)
+                str(security_errors)
             )
         )
 
     if form.errors:
+        metrics.incr('post_comment.invalid')
         for err in form.errors:
             error(request, err, 'comment')
         return http.HttpResponseRedirect(target.get_absolute_url())
 
     # Create the comment
-    comment = form.get_comment_object(site_id=get_current_site(request).id)
-    comment.user = request.user
+    with metrics.timer('post_comment.duplicate_check'):
+        comment = form.get_comment_object(
+            site_id=get_current_site(request).id, user=request.user
+        )
+    if not comment._state.adding:
+        # The same comment has already been posted today.
+        metrics.incr('post_comment.duplicate')
+        return http.HttpResponseRedirect(comment.get_absolute_url())
 
     # Signal that the comment is about to be saved
-    responses = signals.comment_will_be_posted.send(
-        sender=comment.__class__,
-        comment=comment,
-        request=request
-    )
+    with metrics.timer('post_comment.will_be_posted'):
+        responses = signals.comment_will_be_posted.send(
+            sender=comment.__class__,
+            comment=comment,
+            request=request,
+            content_object=target
+        )
 
     for receiver, response in responses:
         if response is False:
+            metrics.incr('post_comment.rejected')
             return CommentPostBadRequest(
                 'comment_will_be_posted receiver %r '
                 'killed the comment' % receiver.__name__
             )
 
-    # Save the comment and signal that it was saved
-    comment.save()
-    signals.comment_was_posted.send(
-        sender=comment.__class__,
-        comment=comment,
-        request=request
-    )
+    # Save the comment and signal that it was saved, in one transaction
+    # if notifications are queued, so that they're saved with it. Emails
+    # are otherwise sent right away, and not while holding a transaction.
+    from commentary import COMMENTS_USE_OUTBOX
+    if COMMENTS_USE_OUTBOX:
+        with transaction.atomic(using=using):
+            save_comment(comment, request, target)
+    else:
+        save_comment(comment, request, target)
 
+    metrics.incr('post_comment.posted')
     return http.HttpResponseRedirect(comment.get_absolute_url())
+
+
+def save_comment(comment, request, target):
+    """Save a new comment and send the ``comment_was_posted`` signal."""
+    with metrics.timer('post_comment.save'):
+        comment.save()
+        models.CommentCounter.objects.track(comment, was_public=False)
+    with metrics.timer('post_comment.was_posted'):
+        signals.comment_was_posted.send(
+            sender=comment.__class__,
+            comment=comment,
+            request=request,
+            content_object=target
+        )
@@ -1,6 +1,8 @@
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.sites.shortcuts import get_current_site
 from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.csrf import csrf_protect
 
@@ -120,8 +122,9 @@ def perform_delete(request, comment):
         user=request.user,
         flag=models.CommentFlag.MODERATOR_DELETION
     )
-    comment.is_removed = True
-    comment.save()
+    was_public = comment.is_public and not comment.is_removed
+    comment.mark_removed()
+    models.CommentCounter.objects.track(comment, was_public)
     signals.comment_was_flagged.send(
         sender=comment.__class__,
         comment=comment,
@@ -137,9 +140,9 @@ def perform_approve(request, comment):
         user=request.user,
         flag=models.CommentFlag.MODERATOR_APPROVAL,
     )
-    comment.is_removed = False
-    comment.is_public = True
-    comment.save()
+    was_public = comment.is_public and not comment.is_removed
+    comment.mark_approved()
+    models.CommentCounter.objects.track(comment, was_public)
     signals.comment_was_flagged.send(
         sender=comment.__class__,
         comment=comment,
@@ -147,3 +150,67 @@ def perform_approve(request, comment):
         created=created,
         request=request,
     )
+
+
+#: The number of comments handled in each query by the bulk actions.
+BULK_BATCH_SIZE = 500
+
+
+def _perform_bulk(request, queryset, flag, counted=None, delta=0, **changes):
+    """
+    Flag the comments of a queryset and apply ``changes`` to them with a
+    few set-based queries for each batch of comments, then send a single
+    ``comments_were_flagged`` signal. The counters of the comments matching
+    ``counted`` are updated by ``delta``. Returns the number of comments.
+    """
+    manager = queryset.model._default_manager
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    with transaction.atomic(using=manager.db):
+        for start in range(0, len(ids), BULK_BATCH_SIZE):
+            batch_ids = ids[start:start + BULK_BATCH_SIZE]
+            batch = manager.filter(pk__in=batch_ids)
+            if changes:
+                counts = models.CommentCounter.objects.count_many(
+                    batch.filter(counted)
+                ) if counted is not None else []
+                batch.update(**changes)
+                models.CommentCounter.objects.add_many(
+                    queryset.model, counts, delta
+                )
+            models.CommentFlag.objects.bulk_create((
+                models.CommentFlag(
+                    comment_id=pk, user=request.user, flag=flag
+                ) for pk in batch_ids
+            ), ignore_conflicts=True)
+    signals.comments_were_flagged.send(
+        sender=queryset.model,
+        comment_ids=ids,
+        flag=flag,
+        request=request,
+    )
+    return len(ids)
+
+
+def perform_bulk_flag(request, queryset):
+    """Flag the comments of a queryset for removal."""
+    return _perform_bulk(
+        request, queryset, models.CommentFlag.SUGGEST_REMOVAL
+    )
+
+
+def perform_bulk_delete(request, queryset):
+    """Remove the comments of a queryset."""
+    return _perform_bulk(
+        request, queryset, models.CommentFlag.MODERATOR_DELETION,
+        counted=Q(is_public=True, is_removed=False), delta=-1,
+        is_removed=True
+    )
+
+
+def perform_bulk_approve(request, queryset):
+    """Approve the comments of a queryset."""
+    return _perform_bulk(
+        request, queryset, models.CommentFlag.MODERATOR_APPROVAL,
+        counted=Q(is_public=False) | Q(is_removed=True), delta=1,
+        is_public=True, is_removed=False
+    )
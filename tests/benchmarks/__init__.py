@@ -0,0 +1,13 @@
+"""
+Benchmarks of the comment hot paths.
+
+Run them through the test runner::
+
+    python tests/runtests.py --benchmark
+    python tests/runtests.py --benchmark --sizes 1000 10000 100000 \\
+        --shapes deep --scenarios render_list feed --output results.json
+
+Each scenario runs against a thread of seeded comments and reports its
+wall time, query count and peak memory (as traced by ``tracemalloc``)
+as JSON, so that results can be compared between revisions.
+"""
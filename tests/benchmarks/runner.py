@@ -0,0 +1,119 @@
+"""Command line runner of the benchmarks."""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import django
+from django.db import connection, transaction
+from django.test.runner import DiscoverRunner
+
+from .scenarios import SCENARIOS
+from .seed import SHAPES, seed_thread
+
+SIZES = (1000, 10000, 100000)
+
+
+class QueryCounter:
+    """
+    Count the executed queries. Unlike ``CaptureQueriesContext``, this
+    isn't reset by the ``request_started`` signal of the test client.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func):
+    """
+    Call ``func`` three times, each in a transaction that is rolled back:
+    once to warm up caches, once to count queries and time it, and once to
+    trace its peak memory. Tracing slows it down, hence the separate calls.
+    """
+    def call(wrapper=None):
+        with transaction.atomic():
+            if wrapper is None:
+                func()
+            else:
+                with connection.execute_wrapper(wrapper):
+                    func()
+            transaction.set_rollback(True)
+
+    call()
+    queries = QueryCounter()
+    start = time.perf_counter()
+    call(queries)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        call()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'time': elapsed,
+        'queries': queries.count,
+        'peak_memory': peak_memory,
+    }
+
+
+def run(sizes, shapes, scenarios, stream=sys.stderr):
+    """Run the scenarios against each thread and return the results."""
+    results = []
+    for size in sizes:
+        for shape in shapes:
+            with transaction.atomic():
+                stream.write('Seeding a %s thread of %d comments\n' % (
+                    shape, size
+                ))
+                article = seed_thread(size, shape)
+                for name in scenarios:
+                    stream.write('  %s\n' % name)
+                    result = {'scenario': name, 'size': size, 'shape': shape}
+                    result.update(measure(SCENARIOS[name](article)))
+                    results.append(result)
+                transaction.set_rollback(True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='runtests.py --benchmark', description='Run the benchmarks.'
+    )
+    parser.add_argument(
+        '--sizes', nargs='+', type=int, default=SIZES, metavar='N',
+        help='Number of comments in each thread.'
+    )
+    parser.add_argument(
+        '--shapes', nargs='+', choices=SHAPES, default=SHAPES,
+        help='Shapes of the threads.'
+    )
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=sorted(SCENARIOS),
+        default=list(SCENARIOS), metavar='SCENARIO',
+        help='Scenarios to run; one of %s.' % ', '.join(sorted(SCENARIOS))
+    )
+    parser.add_argument(
+        '--output', type=argparse.FileType('w'), default=sys.stdout,
+        help='File to write the JSON report to; defaults to stdout.'
+    )
+    options = parser.parse_args(argv)
+
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        results = run(options.sizes, options.shapes, options.scenarios)
+    finally:
+        runner.teardown_databases(old_config)
+    json.dump({
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'results': results,
+    }, options.output, indent=2)
+    options.output.write('\n')
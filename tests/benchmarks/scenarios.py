@@ -0,0 +1,119 @@
+"""
+The benchmarked scenarios. Each scenario is a function that receives
+the seeded article and returns a callable which performs the work.
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.template import Context, Template
+from django.test import Client
+from django.test.utils import override_settings
+
+import commentary
+from commentary import get_form, get_model
+
+#: The number of comments saved or posted by the write scenarios.
+WRITES = 100
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    """Register a benchmark scenario."""
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def _render(template, article):
+    return Template('{% load comments %}' + template).render(
+        Context({'object': article})
+    )
+
+
+def _new_comment(article, **kwargs):
+    return get_model()(content_object=article, site_id=1, **kwargs)
+
+
+@scenario
+def save_top_level(article):
+    """Save new top-level comments."""
+    user = User.objects.get(username='benchmark')
+
+    def run():
+        for n in range(WRITES):
+            _new_comment(
+                article, user=user, body='Top-level #%d' % n
+            ).save()
+    return run
+
+
+@scenario
+def save_reply(article):
+    """Save replies spread over the thread."""
+    pks = list(
+        get_model().objects.for_model(article)
+        .values_list('pk', flat=True)
+    )
+    parents = pks[::max(len(pks) // WRITES, 1)][:WRITES]
+    user = User.objects.get(username='benchmark')
+
+    def run():
+        for n, pk in enumerate(parents):
+            _new_comment(
+                article, user=user, body='Reply #%d' % n, parent_id=pk
+            ).save()
+    return run
+
+
+@scenario
+def render_list(article):
+    """Render the whole thread with ``render_comment_list``."""
+    return lambda: _render('{% render_comment_list for object %}', article)
+
+
+@scenario
+def render_list_rows(article):
+    """Render the whole thread, fetching rows instead of models."""
+    @mock.patch.object(commentary, 'COMMENTS_USE_ROWS', True)
+    def run():
+        _render('{% render_comment_list for object %}', article)
+    return run
+
+
+@scenario
+def render_page(article):
+    """Render the first page of the thread."""
+    return lambda: _render(
+        '{% get_comment_list for object as comment_list page_size 50 %}'
+        '{% include "comments/list.html" %}', article
+    )
+
+
+@scenario
+def comment_count(article):
+    """Count the comments of the thread."""
+    return lambda: _render(
+        '{% get_comment_count for object as count %}{{ count }}', article
+    )
+
+
+@scenario
+def post_comment(article):
+    """Post comments through the view of the default URLconf."""
+    client = Client()
+    client.force_login(User.objects.get(username='benchmark'))
+    data = get_form()(article).generate_security_data()
+
+    def run():
+        with override_settings(ROOT_URLCONF='testapp.urls_default'):
+            for n in range(WRITES):
+                data['comment'] = 'Posted #%d' % n
+                client.post('/post/', data)
+    return run
+
+
+@scenario
+def feed(article):
+    """Fetch the feed of the latest comments."""
+    client = Client()
+    return lambda: client.get('/rss/comments/')
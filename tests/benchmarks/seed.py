@@ -0,0 +1,70 @@
+"""Seeding of comment threads for the benchmarks."""
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+
+from commentary import get_model
+from commentary.abstracts import encode_node
+
+from testapp.models import Article, Author
+
+#: The number of levels of a thread of the ``deep`` shape.
+#: Deeper replies start a new thread under the next top-level comment.
+DEEP_LEVELS = 100
+
+SHAPES = ('wide', 'deep')
+
+
+def seed_thread(size, shape, batch_size=1000):
+    """
+    Create an article with ``size`` comments and return it. In the
+    ``wide`` shape, every comment is a top-level one; in the ``deep``
+    shape, every comment replies to the previous one, for up to
+    ``DEEP_LEVELS`` levels.
+    """
+    if shape not in SHAPES:
+        raise ValueError('Unknown thread shape: %r' % shape)
+    model = get_model()
+    author = Author.objects.create(first_name='Bench', last_name='Mark')
+    article = Article.objects.create(author=author, headline='Benchmark')
+    user = User.objects.get_or_create(username='benchmark')[0]
+    content_type = ContentType.objects.get_for_model(article)
+    levels = DEEP_LEVELS if shape == 'deep' else 1
+    # The tree fields depend on the primary keys, so they are set
+    # explicitly instead of letting the database assign them.
+    start = (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    end = start + size
+    batch, path = [], ''
+    for pk in range(start, end):
+        depth = (pk - start) % levels + 1
+        if depth == 1:
+            path, root_id, parent_id = encode_node(pk), pk, None
+        else:
+            parent_id = pk - 1
+            path = '%s/%s' % (path, encode_node(pk))
+        comment = model(
+            id=pk, content_type=content_type, object_pk=str(article.pk),
+            site_id=1, user=user, body='Comment #%d' % pk, path=path,
+            depth=depth, root_id=root_id, parent_id=parent_id,
+            leaf_id=pk + 1 if depth < levels and pk + 1 < end else None
+        )
+        comment.render_body()
+        comment.digest = comment.make_digest()
+        batch.append(comment)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    model.objects.bulk_create(batch)
+    _reset_sequences(model)
+    return article
+
+
+def _reset_sequences(model):
+    """Move the primary key sequence past the explicitly set ids."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -27,3 +27,11 @@ def get_delete_url(c):
 
 def get_approve_url(c):
     return reverse(views.custom_approve_comment, args=(c.id,))
+
+
+def get_user_displays(users):
+    return {u.pk: 'Custom %s' % u.get_username() for u in users}
+
+
+def get_user_display(user):
+    return 'Custom %s' % (user.get_username() if user else 'anonymous')
@@ -59,7 +59,16 @@ def main(test_labels=None):
     sys.exit(failures)
 
 
+def benchmark(argv):
+    django.setup()
+    from benchmarks.runner import main as run_benchmarks
+    run_benchmarks(argv)
+
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['--benchmark']:
+        benchmark(sys.argv[2:])
+        sys.exit(0)
     test_labels = None
     if len(sys.argv) > 1:
         test_labels = sys.argv[1:]
@@ -32,5 +32,10 @@ class Entry(models.Model):
         return self.title
 
 
+class ProxyEntry(Entry):
+    class Meta:
+        proxy = True
+
+
 class Book(models.Model):
     dewey_decimal = models.DecimalField(primary_key=True, decimal_places=2, max_digits=5)
@@ -75,6 +75,13 @@ class CommentTestCase(TestCase):
 
         return c1, c2, c3, c4
 
+    def createComment(self, obj, body='Some comment', parent=None, **kwargs):
+        kwargs.setdefault('site', Site.objects.get_current())
+        return Comment.objects.create(
+            content_type=CT(obj), object_pk=str(obj.pk),
+            body=body, parent=parent, **kwargs
+        )
+
     def getData(self):
         return {
             'name': 'Jim Bob',
@@ -1,5 +1,9 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.core.exceptions import ImproperlyConfigured
 from django.test.utils import modify_settings, override_settings
+from django.urls import clear_script_prefix, reverse, set_script_prefix
 
 import commentary
 from commentary.models import Comment
@@ -38,6 +42,52 @@ class CommentAppAPITests(CommentTestCase):
         c = Comment(id=12345)
         self.assertEqual(commentary.get_approve_url(c), "/approve/12345/")
 
+    def testCommentAppIsCached(self):
+        commentary.get_comment_app()
+        with mock.patch.object(commentary, 'import_module') as im:
+            self.assertEqual(commentary.get_comment_app(), commentary)
+            self.assertEqual(commentary.get_model(), Comment)
+        im.assert_not_called()
+
+    def testResetCommentApp(self):
+        commentary.get_model()
+        with override_settings(COMMENTS_APP='custom_comments'):
+            from custom_comments.models import CustomComment
+            self.assertEqual(commentary.get_model(), CustomComment)
+        self.assertEqual(commentary.get_model(), Comment)
+
+    def testReverseCommentURL(self):
+        for args in ((1, '42'), (7, 'a b/c%d'), (3, 'caf\xe9?')):
+            self.assertEqual(
+                commentary.reverse_comment_url('comments-url-redirect', *args),
+                reverse('comments-url-redirect', args=args)
+            )
+
+    def testReverseCommentURLIsCached(self):
+        commentary.reverse_comment_url('comments-flag', 1)
+        with mock.patch.object(commentary, 'reverse') as rev:
+            url = commentary.reverse_comment_url('comments-flag', 12345)
+        rev.assert_not_called()
+        self.assertEqual(url, "/flag/12345/")
+
+    def testReverseCommentURLScriptPrefix(self):
+        commentary.reverse_comment_url('comments-delete', 1)
+        set_script_prefix('/prefix/')
+        try:
+            c = Comment(id=12345)
+            self.assertEqual(
+                commentary.get_delete_url(c), "/prefix/delete/12345/"
+            )
+        finally:
+            clear_script_prefix()
+
+    def testGetUserDisplays(self):
+        user = User.objects.get(username='normaluser')
+        self.assertEqual(
+            commentary.get_user_displays([user]),
+            {user.pk: commentary.get_user_display(user)}
+        )
+
 
 @override_settings(
     COMMENTS_APP='custom_comments', ROOT_URLCONF='testapp.urls',
@@ -63,6 +113,23 @@ class CustomCommentTest(CommentTestCase):
         c = Comment(id=12345)
         self.assertEqual(commentary.get_flag_url(c), "/flag/12345/")
 
+    def testGetUserDisplays(self):
+        user = User.objects.get(username='normaluser')
+        self.assertEqual(
+            commentary.get_user_displays([user]),
+            {user.pk: 'Custom normaluser'}
+        )
+
+    def testAttachUserDisplays(self):
+        user = User.objects.get(username='normaluser')
+        comments = commentary.attach_user_displays([
+            Comment(user=user), Comment()
+        ])
+        self.assertEqual(
+            [c.user_display for c in comments],
+            ['Custom normaluser', 'Custom anonymous']
+        )
+
     def getGetDeleteURL(self):
         c = Comment(id=12345)
         self.assertEqual(commentary.get_delete_url(c), "/delete/12345/")
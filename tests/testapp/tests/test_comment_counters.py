@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.template import Context, Template
+
+import commentary
+from commentary.models import CommentCounter
+from commentary.views.moderation import perform_approve, perform_delete
+
+from . import CommentTestCase
+from testapp.models import Article
+
+
+class FakeRequest(object):
+    def __init__(self, user):
+        self.user = user
+
+
+class CommentCounterTests(CommentTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(commentary, 'COMMENTS_USE_COUNTERS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.article = Article.objects.get(pk=1)
+        self.request = FakeRequest(User.objects.get(username='normaluser'))
+
+    def getCount(self):
+        return CommentCounter.objects.get_counts(
+            self.comment.content_type, [self.article.pk], self.comment.site_id
+        ).get(self.article.pk)
+
+    def testTrack(self):
+        self.createComment(self.article)
+        self.comment = self.createComment(self.article)
+        self.assertIsNone(self.getCount())
+        # the first update counts the existing comments
+        CommentCounter.objects.track(self.comment, was_public=False)
+        self.assertEqual(self.getCount(), 2)
+        perform_delete(self.request, self.comment)
+        self.assertEqual(self.getCount(), 1)
+        # deleting twice doesn't change the count
+        perform_delete(self.request, self.comment)
+        self.assertEqual(self.getCount(), 1)
+        perform_approve(self.request, self.comment)
+        self.assertEqual(self.getCount(), 2)
+
+    def testCountTags(self):
+        self.comment = self.createComment(self.article)
+        CommentCounter.objects.track(self.comment, was_public=False)
+        # the counter is out of date to show that it's used
+        CommentCounter.objects.update(count=5)
+        t = "{% load comments %}{% get_comment_count for a as cc %}{{ cc }}"
+        with self.assertNumQueries(1):
+            out = Template(t).render(Context({'a': self.article}))
+        self.assertEqual(out, '5')
+        t = "{% load comments %}{% get_comment_counts for articles as counts %}"
+        t += "{% for a, count in counts %}{{ count }} {% endfor %}"
+        articles = Article.objects.order_by('pk')
+        with self.assertNumQueries(3):
+            out = Template(t).render(Context({'articles': articles}))
+        self.assertEqual(out, '5 0 ')
+
+    def testRebuildCommand(self):
+        self.createComment(self.article)
+        self.createComment(self.article, is_removed=True)
+        self.comment = self.createComment(self.article)
+        self.createComment(Article.objects.get(pk=2))
+        call_command('rebuild_comment_counters', verbosity=0)
+        self.assertEqual(CommentCounter.objects.count(), 2)
+        self.assertEqual(self.getCount(), 2)
@@ -1,6 +1,8 @@
 import time
+from datetime import timedelta
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 
 from commentary.forms import CommentForm
@@ -98,3 +100,46 @@ class CommentFormTests(CommentTestCase):
 
         # Restore settings
         settings.PROFANITIES_LIST, settings.COMMENTS_ALLOW_PROFANITIES = saved
+
+
+class DuplicateCommentTests(CommentTestCase):
+
+    def setUp(self):
+        self.article = Article.objects.get(pk=1)
+        self.user = User.objects.get(username='normaluser')
+        self.comment = self.createComment(
+            self.article, body='Hello  there\n', user=self.user
+        )
+
+    def getCommentObject(self, body, user):
+        data = dict(self.getValidData(self.article), comment=body)
+        f = CommentForm(self.article, data=data)
+        self.assertTrue(f.is_valid(), f.errors)
+        with self.assertNumQueries(1):
+            return f.get_comment_object(user=user)
+
+    def testDuplicate(self):
+        c = self.getCommentObject('Hello there', self.user)
+        self.assertEqual(c, self.comment)
+
+    def testNotDuplicate(self):
+        other = User.objects.create_user('otheruser')
+        for body, user in (('Hello there', other), ('Hello!', self.user)):
+            c = self.getCommentObject(body, user)
+            self.assertTrue(c._state.adding)
+            self.assertEqual(c.user, user)
+
+    def testPreviousDay(self):
+        Comment.objects.filter(pk=self.comment.pk).update(
+            submit_date=self.comment.submit_date - timedelta(days=1)
+        )
+        c = self.getCommentObject('Hello there', self.user)
+        self.assertTrue(c._state.adding)
+
+    def testDigestUpdated(self):
+        digest = self.comment.digest
+        self.comment.body = 'Goodbye'
+        self.comment.save(update_fields=['body'])
+        self.comment.refresh_from_db()
+        self.assertNotEqual(self.comment.digest, digest)
+        self.assertEqual(self.comment.digest, self.comment.make_digest())
@@ -0,0 +1,95 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+import commentary
+from commentary import managers, signals
+from commentary.models import CommentNotification
+from commentary.moderation import CommentModerator
+
+from . import CommentTestCase
+from testapp.models import Entry
+
+
+class EntryModerator(CommentModerator):
+    email_notification = True
+
+
+@override_settings(MANAGERS=(('Manager', 'manager@example.com'),))
+class CommentOutboxTests(CommentTestCase):
+    fixtures = ['comment_tests', 'comment_utils.xml']
+
+    def setUp(self):
+        patcher = mock.patch.object(commentary, 'COMMENTS_USE_OUTBOX', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.entry = Entry.objects.get(pk=1)
+        self.moderator = EntryModerator(Entry)
+        self.request = RequestFactory().get('/')
+        self.user = User.objects.get(username='normaluser')
+
+    def notify(self, count=1):
+        for i in range(count):
+            comment = self.createComment(
+                self.entry, body='Comment %d' % i, user=self.user
+            )
+            self.moderator.email(comment, self.entry, self.request)
+
+    def testQueue(self):
+        self.notify()
+        self.assertEqual(len(mail.outbox), 0)
+        notification = CommentNotification.objects.get()
+        self.assertEqual(notification.recipient_list, ['manager@example.com'])
+        self.assertIn('Comment 0', notification.message)
+
+    def testProcessOutbox(self):
+        self.notify(3)
+        out = StringIO()
+        with mock.patch.object(
+            managers, 'send_mass_mail', wraps=managers.send_mass_mail
+        ) as send_mass_mail:
+            call_command('process_comment_outbox', batch_size=2, stdout=out)
+        self.assertEqual(out.getvalue(), 'Sent 3 comment notifications.\n')
+        self.assertEqual(send_mass_mail.call_count, 2)
+        connections = {c[1]['connection'] for c in send_mass_mail.call_args_list}
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['manager@example.com'])
+        self.assertFalse(CommentNotification.objects.exists())
+
+    def testSendFailure(self):
+        self.notify()
+        with mock.patch.object(
+            managers, 'send_mass_mail', side_effect=OSError
+        ), self.assertRaises(OSError):
+            call_command('process_comment_outbox', verbosity=0)
+        self.assertTrue(CommentNotification.objects.exists())
+
+    def testWithoutOutbox(self):
+        with mock.patch.object(commentary, 'COMMENTS_USE_OUTBOX', False):
+            self.notify()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(CommentNotification.objects.exists())
+
+    def testPostTransaction(self):
+        savepoints = []
+
+        def receive(sender, **kwargs):
+            savepoints.append(len(connection.savepoint_ids))
+        signals.comment_was_posted.connect(receive)
+        self.addCleanup(signals.comment_was_posted.disconnect, receive)
+        self.client.force_login(self.user)
+        outside = len(connection.savepoint_ids)
+        self.client.post('/post/', self.getValidData(self.entry))
+        with mock.patch.object(commentary, 'COMMENTS_USE_OUTBOX', False):
+            self.client.post('/post/', dict(
+                self.getValidData(self.entry), comment='Another comment'
+            ))
+        # Only queued notifications are saved in a transaction.
+        self.assertEqual(savepoints, [outside + 1, outside])
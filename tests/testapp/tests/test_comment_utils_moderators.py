@@ -1,12 +1,13 @@
 from django.core import mail
 from django.test.utils import override_settings
 
+from commentary import signals
 from commentary.models import Comment
 from commentary.moderation import (moderator, CommentModerator,
     AlreadyModerated)
 
-from . import CommentTestCase
-from testapp.models import Entry
+from . import CT, CommentTestCase
+from testapp.models import Article, Entry, ProxyEntry
 
 
 class EntryModerator1(CommentModerator):
@@ -83,6 +84,18 @@ class CommentUtilsModeratorTests(CommentTestCase):
         self.createSomeComments()
         self.assertEqual(Comment.objects.all().count(), 1)
 
+    def testProxyContentObject(self):
+        moderator.register(Entry, EntryModerator2)
+        entry = ProxyEntry.objects.get(pk=2)
+        comment = Comment(
+            content_type=CT(entry), object_pk=entry.pk, body='Proxy'
+        )
+        responses = signals.comment_will_be_posted.send(
+            sender=Comment, comment=comment, request=None,
+            content_object=entry
+        )
+        self.assertIn(False, [response for _, response in responses])
+
     def testAutoCloseField(self):
         moderator.register(Entry, EntryModerator3)
         self.createSomeComments()
@@ -102,3 +115,16 @@ class CommentUtilsModeratorTests(CommentTestCase):
         moderator.register(Entry, EntryModerator6)
         c1, c2 = self.createSomeComments()
         self.assertEqual(Comment.objects.all().count(), 0)
+
+    def testContentObjectFromSignal(self):
+        moderator.register(Entry, EntryModerator4)
+        e = Entry.objects.get(pk=1)
+        comment = Comment(content_type=CT(Entry), object_pk=str(e.pk))
+        with self.assertNumQueries(0):
+            moderator.pre_save_moderation(
+                Comment, comment, None, content_object=e
+            )
+            moderator.pre_save_moderation(
+                Comment, comment, None, content_object=Article(pk=1)
+            )
+        self.assertFalse(comment.is_public)
@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.contrib.contenttypes.models import ContentType
 from django.core.management import call_command
 
-from django_comments.models import Comment
+from commentary.models import Comment, CommentCounter
 
 from . import CommentTestCase
 from testapp.models import Article
@@ -30,3 +33,62 @@ class CommentManagerTests(CommentTestCase):
 
         self.assertEqual(0, Comment.objects.for_model(Article).count())
         self.assertEqual(initial_count - article_comments_count, Comment.objects.count())
+
+    def createStaleComments(self):
+        articles = Article.objects.all()[:2]
+        for article in articles:
+            self.createComment(article)
+        self.createComment(Article(pk=12345))
+        self.createComment(Article(pk=12346))
+        Comment.objects.create(
+            content_type=ContentType.objects.get_for_model(Article),
+            object_pk='not a pk', body='Stale', site_id=1
+        )
+        return [a.pk for a in articles]
+
+    def testBatches(self):
+        pks = self.createStaleComments()
+        CommentCounter.objects.rebuild(Comment.objects.all())
+        out = StringIO()
+        call_command(
+            'delete_stale_comments', '--yes',
+            batch_size=2, verbosity=2, stdout=out
+        )
+        self.assertEqual(
+            sorted(Comment.objects.values_list('object_pk', flat=True)),
+            sorted(str(pk) for pk in pks)
+        )
+        self.assertEqual(CommentCounter.objects.count(), 2)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[-3:], [
+            'testapp | article: checked 5 objects, 3 missing',
+            "3 comments on 3 non-existing `article' objects",
+            'Deleted 3 stale comments.',
+        ])
+
+    def testDryRun(self):
+        self.createStaleComments()
+        out = StringIO()
+        call_command('delete_stale_comments', '--dry-run', stdout=out)
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertIn('Found 3 stale comments.', out.getvalue())
+
+    def testMissingModel(self):
+        ctype = ContentType.objects.create(app_label='gone', model='gone')
+        Comment.objects.create(
+            content_type=ctype, object_pk='1', body='Stale', site_id=1
+        )
+        out = StringIO()
+        call_command('delete_stale_comments', '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            "Skipped 1 comments on `gone.gone' objects, "
+            "whose model is not installed",
+            'Found 0 stale comments.',
+        ])
+        call_command('delete_stale_comments', '--yes', verbosity=0)
+        self.assertTrue(Comment.objects.exists())
+        call_command(
+            'delete_stale_comments', '--yes', '--include-missing-models',
+            verbosity=0
+        )
+        self.assertFalse(Comment.objects.exists())
@@ -1,12 +1,9 @@
 from xml.etree import ElementTree as ET
 
 from django.conf import settings
-from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.test.utils import override_settings
 
-from commentary.models import Comment
-
 from . import CommentTestCase
 from testapp.models import Article
 
@@ -19,13 +16,8 @@ class CommentFeedTests(CommentTestCase):
         site_2 = Site.objects.create(id=settings.SITE_ID + 1,
             domain="example2.com", name="example2.com")
         # A comment for another site
-        Comment.objects.create(
-            content_type=ContentType.objects.get_for_model(Article),
-            object_pk="1",
-            user_name="Joe Somebody",
-            user_email="jsomebody@example.com",
-            user_url="http://example.com/~joe/",
-            comment="A comment for the second site.",
+        self.createComment(
+            Article.objects.get(pk=1), "A comment for the second site.",
             site=site_2,
         )
 
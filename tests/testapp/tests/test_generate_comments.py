@@ -0,0 +1,121 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+
+import commentary
+from commentary.abstracts import encode_node
+from commentary.models import Comment, CommentCounter, CommentFlag
+
+from . import CommentTestCase
+from testapp.models import Article, Author
+
+
+class GenerateCommentsTests(CommentTestCase):
+
+    def generate(self, *args, **kwargs):
+        out = StringIO()
+        call_command('generate_comments', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def assertValidTrees(self):
+        comments = {c.pk: c for c in Comment.objects.all()}
+        for comment in comments.values():
+            parent = comments.get(comment.parent_id)
+            if parent is None:
+                self.assertIsNone(comment.parent_id)
+                self.assertEqual(comment.path, encode_node(comment.pk))
+                self.assertEqual(
+                    (comment.depth, comment.root_id), (1, comment.pk)
+                )
+            else:
+                self.assertEqual(comment.path, '%s/%s' % (
+                    parent.path, encode_node(comment.pk)
+                ))
+                self.assertEqual(comment.depth, parent.depth + 1)
+                self.assertEqual(comment.root_id, parent.root_id)
+                self.assertEqual(comment.object_pk, parent.object_pk)
+            replies = [
+                c for c in comments.values() if c.parent_id == comment.pk
+            ]
+            leaf = max(replies, key=lambda c: c.submit_date, default=None)
+            self.assertEqual(comment.leaf, leaf)
+
+    def testGenerate(self):
+        out = self.generate(
+            'testapp.article', 'testapp.author', count=60, users=3,
+            batch_size=7, max_depth=3, seed=1
+        )
+        self.assertEqual(out, 'Generated 60 comments.\n')
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertEqual(
+            Comment.objects.for_model(Article).count(),
+            Comment.objects.for_model(Author).count()
+        )
+        self.assertEqual(
+            set(Comment.objects.values_list('user__username', flat=True)),
+            {'commenter1', 'commenter2', 'commenter3'}
+        )
+        self.assertValidTrees()
+        self.assertLessEqual(
+            max(Comment.objects.values_list('depth', flat=True)), 3
+        )
+        self.assertGreater(
+            Comment.objects.filter(parent__isnull=False).count(), 0
+        )
+        comment = Comment.objects.order_by('submit_date').first()
+        self.assertLess(comment.submit_date, Comment.objects.latest(
+            'submit_date'
+        ).submit_date)
+        self.assertEqual(comment.edit_date, comment.submit_date)
+        self.assertEqual(comment.digest, comment.make_digest())
+        self.assertIsNotNone(comment.body_html)
+        # The generated ids don't clash with new comments.
+        self.createComment(Article.objects.get(pk=1))
+
+    def testShapes(self):
+        self.generate('testapp.article', count=10, shape='wide', objects=1)
+        self.assertFalse(Comment.objects.filter(parent__isnull=False))
+        self.generate(
+            'testapp.article', count=10, shape='deep', max_depth=4,
+            objects=1
+        )
+        self.assertEqual(
+            sorted(Comment.objects.filter(depth__gt=1).values_list(
+                'depth', flat=True
+            )), [2, 2, 2, 3, 3, 4, 4]
+        )
+        self.assertValidTrees()
+
+    def testModerationStates(self):
+        self.generate(
+            'testapp.article', count=20, users=2, flagged=1,
+            unapproved=1, removed=1
+        )
+        self.assertFalse(Comment.objects.filter(is_public=True))
+        self.assertFalse(Comment.objects.filter(is_removed=False))
+        self.assertEqual(CommentFlag.objects.filter(
+            flag=CommentFlag.SUGGEST_REMOVAL
+        ).count(), 20)
+
+    def testExistingUsers(self):
+        User.objects.create(username='commenter1')
+        self.generate('testapp.article', count=5, users=2)
+        self.assertEqual(
+            User.objects.filter(username__startswith='commenter').count(), 2
+        )
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_COUNTERS', True)
+    def testCounters(self):
+        self.generate(
+            'testapp.article', count=10, objects=1, unapproved=0, removed=0
+        )
+        self.assertEqual(CommentCounter.objects.get().count, 10)
+
+    def testErrors(self):
+        with self.assertRaises(CommandError):
+            self.generate('testapp.missing')
+        Author.objects.all().delete()
+        with self.assertRaises(CommandError):
+            self.generate('testapp.author')
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from commentary.models import Comment
+
+from . import CommentTestCase
+from testapp.models import Article
+
+
+class ImportCommentsTests(CommentTestCase):
+
+    def importComments(self, *rows, **kwargs):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.jsonl', delete=False
+        ) as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_comments', f.name, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def row(self, id, parent=None, **kwargs):
+        row = {
+            'id': id, 'parent': parent, 'content_type': 'testapp.article',
+            'object_pk': 1, 'body': 'Comment %s' % id,
+        }
+        row.update(kwargs)
+        return row
+
+    def testImport(self):
+        out = self.importComments(
+            self.row('c', parent='a', submit_date='2020-01-02T00:00:00Z'),
+            self.row('a', user='normaluser',
+                     submit_date='2020-01-01T00:00:00Z'),
+            self.row('b', parent='a', submit_date='2020-01-03T00:00:00Z'),
+            self.row('d', is_public=False),
+            batch_size=2
+        )
+        self.assertEqual(out, 'Imported 4 comments.\n')
+        a = Comment.objects.get(body='Comment a')
+        self.assertEqual(a.user, User.objects.get(username='normaluser'))
+        self.assertEqual(a.submit_date, timezone.make_naive(
+            datetime(2020, 1, 1, tzinfo=timezone.utc)
+        ))
+        self.assertEqual(a.leaf.body, 'Comment b')
+        self.assertEqual(
+            sorted(c.body for c in a.replies.all()), ['Comment b', 'Comment c']
+        )
+        for reply in a.replies.all():
+            self.assertEqual((reply.root_id, reply.depth), (a.pk, 2))
+        self.assertFalse(Comment.objects.get(body='Comment d').is_public)
+        self.assertEqual(
+            Comment.objects.for_model(Article).count(), 4
+        )
+
+    def testErrors(self):
+        with self.assertRaisesMessage(CommandError, 'Line 2: '):
+            self.importComments(self.row('a'), self.row('b', user='missing'))
+        with self.assertRaisesMessage(CommandError, 'Duplicate comment id'):
+            self.importComments(self.row('a', body=''), self.row('a'))
+        with self.assertRaisesMessage(CommandError, 'Line 1: DoesNotExist'):
+            self.importComments(self.row('a', content_type='nope.model'))
+        with self.assertRaisesMessage(CommandError, 'parents'):
+            self.importComments(self.row('a'), self.row('b', parent='c'))
+        with self.assertRaisesMessage(CommandError, 'Invalid date'):
+            self.importComments(self.row('a', submit_date='yesterday'))
+        self.assertFalse(Comment.objects.exists())
+
+    def testRepliesToInsertedComments(self):
+        rows = [self.row(0)]
+        for n in range(1, 10):
+            rows.append(self.row(n, parent=n - 1))
+            rows.append(self.row('r%d' % n, parent=0))
+        self.importComments(*rows, batch_size=2)
+        root = Comment.objects.get(body='Comment 0')
+        self.assertEqual(root.replies.count(), 10)
+        self.assertEqual(root.leaf.body, 'Comment r9')
+        deepest = Comment.objects.get(body='Comment 9')
+        self.assertEqual((deepest.depth, deepest.root_id), (10, root.pk))
+        self.assertEqual(
+            list(Comment.objects.ancestors(deepest).values_list(
+                'body', flat=True
+            )), ['Comment %d' % n for n in range(9)]
+        )
@@ -0,0 +1,162 @@
+import socket
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test.utils import override_settings
+
+from commentary import metrics, signals
+from commentary.models import Comment
+
+from . import CommentTestCase
+from testapp.models import Article
+
+
+class BrokenBackend(metrics.BaseBackend):
+    def incr(self, name, value=1):
+        raise OSError('Broken')
+
+    def timing(self, name, ms):
+        raise OSError('Broken')
+
+
+class UnreachableBackend(metrics.BaseBackend):
+    def __init__(self):
+        raise socket.gaierror('Unknown host')
+
+
+class MetricsTests(CommentTestCase):
+
+    def setUp(self):
+        super(MetricsTests, self).setUp()
+        metrics.reset_backend()
+        self.backend = metrics.get_backend()
+        self.article = Article.objects.get(pk=1)
+        self.client.force_login(User.objects.get(username='normaluser'))
+
+    def tearDown(self):
+        metrics.reset_backend()
+        super(MetricsTests, self).tearDown()
+
+    def post(self, **data):
+        valid = self.getValidData(self.article)
+        valid.update(data)
+        return self.client.post('/post/', valid)
+
+    def testPostedComment(self):
+        self.assertIsInstance(self.backend, metrics.MemoryBackend)
+        self.post()
+        self.assertEqual(self.backend.counters, {'post_comment.posted': 1})
+        self.assertEqual(set(self.backend.timings), {
+            'post_comment.target', 'post_comment.form',
+            'post_comment.security_hash', 'post_comment.duplicate_check',
+            'post_comment.will_be_posted', 'post_comment.save',
+            'post_comment.was_posted',
+        })
+        for samples in self.backend.timings.values():
+            self.assertEqual(len(samples), 1)
+            self.assertGreaterEqual(samples[0], 0)
+
+    def testOutcomes(self):
+        self.post(object_pk='9999')
+        self.post(honeypot='spam')
+        self.post(security_hash='x' * 40)
+        self.post()
+        self.post()
+        self.assertEqual(self.backend.counters, {
+            'post_comment.bad_request': 1,
+            'post_comment.honeypot': 1,
+            'post_comment.security_failed': 1,
+            'post_comment.posted': 1,
+            'post_comment.duplicate': 1,
+        })
+
+    def testRejected(self):
+        def receive(sender, **kwargs):
+            return False
+        signals.comment_will_be_posted.connect(receive)
+        try:
+            response = self.post()
+        finally:
+            signals.comment_will_be_posted.disconnect(receive)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.backend.counters, {'post_comment.rejected': 1})
+        self.assertFalse(Comment.objects.exists())
+
+    def testMaxSamples(self):
+        backend = metrics.MemoryBackend(max_samples=2)
+        for ms in (1, 2, 3):
+            backend.timing('stage', ms)
+        self.assertEqual(list(backend.timings['stage']), [2, 3])
+        backend.reset()
+        self.assertFalse(backend.timings)
+
+    @override_settings(COMMENTS_METRICS={
+        'BACKEND': 'commentary.metrics.LoggingBackend'
+    })
+    def testLoggingBackend(self):
+        with self.assertLogs('commentary.metrics', 'DEBUG') as logs:
+            metrics.incr('post_comment.posted')
+            metrics.timing('post_comment.save', 1.5)
+        self.assertEqual([r.getMessage() for r in logs.records], [
+            'post_comment.posted +1', 'post_comment.save 1.500ms'
+        ])
+
+    def testStatsdBackend(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(5)
+        self.addCleanup(listener.close)
+        with self.settings(COMMENTS_METRICS={
+            'BACKEND': 'commentary.metrics.StatsdBackend',
+            'OPTIONS': {
+                'host': '127.0.0.1', 'port': listener.getsockname()[1],
+                'prefix': 'site',
+            },
+        }):
+            self.assertIsInstance(
+                metrics.get_backend(), metrics.StatsdBackend
+            )
+            metrics.incr('post_comment.posted')
+            metrics.timing('post_comment.save', 1.5)
+        self.assertEqual(
+            listener.recv(512), b'site.post_comment.posted:1|c'
+        )
+        self.assertEqual(
+            listener.recv(512), b'site.post_comment.save:1.500|ms'
+        )
+
+    @override_settings(COMMENTS_METRICS={
+        'BACKEND': 'testapp.tests.test_metrics.BrokenBackend'
+    })
+    def testBackendErrorsAreLogged(self):
+        with self.assertLogs('commentary.metrics', 'ERROR') as logs:
+            response = self.post()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.exists())
+        self.assertEqual(
+            logs.records[-1].getMessage(),
+            'Could not increment the post_comment.posted counter'
+        )
+
+    @override_settings(COMMENTS_METRICS={
+        'BACKEND': 'commentary.metrics.MissingBackend'
+    })
+    def testInvalidBackend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            metrics.get_backend()
+
+    @override_settings(COMMENTS_METRICS={
+        'BACKEND': 'testapp.tests.test_metrics.UnreachableBackend'
+    })
+    def testBackendCreationErrorsAreLogged(self):
+        with self.assertLogs('commentary.metrics', 'ERROR') as logs:
+            response = self.post()
+            self.post(comment='Another comment')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Comment.objects.count(), 2)
+        # The error is logged once, and the measurements are discarded.
+        self.assertEqual(
+            [r.getMessage() for r in logs.records],
+            ['Could not create the metrics backend']
+        )
+        self.assertIsInstance(metrics.get_backend(), metrics.NullBackend)
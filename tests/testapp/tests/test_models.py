@@ -1,6 +1,14 @@
-from commentary.models import Comment
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-from . import CommentTestCase
+from django.core.management import call_command
+
+import commentary
+from commentary.abstracts import NODE_WIDTH, decode_node, encode_node
+from commentary.models import Comment, CommentCounter
+
+from . import CT, CommentTestCase
 from testapp.models import Author, Article
 
 
@@ -55,3 +63,251 @@ class CommentManagerTests(CommentTestCase):
         with self.assertNumQueries(3):
             qs = Comment.objects.prefetch_related('content_object')
             [c.content_object for c in qs]
+
+
+class CommentTreeTests(CommentTestCase):
+
+    def testEncodeNode(self):
+        self.assertEqual(encode_node(0), '0000000')
+        self.assertEqual(encode_node(35), '000000z')
+        self.assertEqual(encode_node(36), '0000010')
+        self.assertEqual(decode_node(encode_node(123456789)), 123456789)
+        self.assertLess(encode_node(9), encode_node(10))
+        with self.assertRaises(ValueError):
+            encode_node(36 ** NODE_WIDTH)
+
+    def testPaths(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.createComment(article)
+        c2 = self.createComment(article, parent=c1)
+        c3 = self.createComment(article, parent=c2)
+        self.assertEqual(c1.path, encode_node(c1.pk))
+        self.assertEqual(c3.path, '/'.join(map(encode_node, (c1.pk, c2.pk, c3.pk))))
+        self.assertEqual(c3.root_id, c1.pk)
+        self.assertEqual(c3.depth, 3)
+        self.assertEqual(
+            Comment.objects.filter(root=c1.pk, depth__lte=2).count(), 2
+        )
+        self.assertEqual(list(c3.ancestors.order_by('path')), [c1, c2])
+
+    def testPathOrdering(self):
+        article = Article.objects.get(pk=1)
+        roots = [self.createComment(article) for _ in range(11)]
+        reply = self.createComment(article, parent=roots[1])
+        expected = roots[:2] + [reply] + roots[2:]
+        self.assertEqual(list(Comment.objects.all()), expected)
+
+    def testLeaf(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.createComment(article)
+        c2 = self.createComment(article, parent=c1)
+        self.assertEqual(c1.leaf, c2)
+        self.assertEqual(Comment.objects.get(pk=c1.pk).leaf_id, c2.pk)
+        c3 = Comment(
+            content_type=c1.content_type, object_pk=c1.object_pk,
+            site=c1.site, body='No leaf', parent=c1
+        )
+        c3.save(update_leaf=False)
+        self.assertEqual(Comment.objects.get(pk=c1.pk).leaf_id, c2.pk)
+
+    def testSaveQueries(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.createComment(article)
+        # INSERT and UPDATE of the path (SQLite can't reserve primary keys)
+        with self.assertNumQueries(2):
+            self.createComment(article)
+        # plus the UPDATE of the parent's leaf
+        with self.assertNumQueries(3):
+            self.createComment(article, parent=c1)
+        # editing a comment doesn't touch the tree
+        with self.assertNumQueries(1):
+            c1.save()
+
+    def createTree(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.createComment(article)
+        c2 = self.createComment(article, parent=c1)
+        c3 = self.createComment(article, parent=c2)
+        c4 = self.createComment(article, parent=c1)
+        c5 = self.createComment(article)
+        c6 = self.createComment(article, parent=c5)
+        return c1, c2, c3, c4, c5, c6
+
+    def testAncestors(self):
+        c1, c2, c3, c4, c5, c6 = self.createTree()
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Comment.objects.ancestors(c3)), [c1, c2])
+        self.assertEqual(list(Comment.objects.ancestors(c1)), [])
+
+    def testDescendants(self):
+        c1, c2, c3, c4, c5, c6 = self.createTree()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(Comment.objects.descendants(c1)), [c2, c3, c4]
+            )
+        self.assertEqual(
+            list(Comment.objects.descendants(c1, max_depth=1)), [c2, c4]
+        )
+        self.assertEqual(list(Comment.objects.descendants(c3)), [])
+
+    def testSubtree(self):
+        c1, c2, c3, c4, c5, c6 = self.createTree()
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(Comment.objects.subtree([c1.pk])), [c1, c2, c3, c4]
+            )
+        self.assertEqual(
+            list(Comment.objects.subtree([c1.pk, c5.pk])),
+            [c1, c2, c3, c4, c5, c6]
+        )
+        self.assertEqual(list(Comment.objects.subtree([])), [])
+
+
+class CommentBulkCreateTreeTests(CommentTestCase):
+
+    def makeComment(self, obj, parent=None, **kwargs):
+        return Comment(
+            content_type=CT(obj), object_pk=str(obj.pk), site_id=1,
+            body='Imported', parent=parent, **kwargs
+        )
+
+    def testForwardReferences(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.makeComment(article)
+        c2 = self.makeComment(article, parent=c1)
+        c3 = self.makeComment(article, parent=c2)
+        c4 = self.makeComment(article, parent=c1)
+        # The replies come before their parents.
+        self.assertEqual(
+            Comment.objects.bulk_create_tree([c3, c4, c2, c1], batch_size=2),
+            4
+        )
+        c1, c2, c3, c4 = (
+            Comment.objects.get(pk=c.pk) for c in (c1, c2, c3, c4)
+        )
+        self.assertEqual(c3.path, '/'.join(
+            map(encode_node, (c1.pk, c2.pk, c3.pk))
+        ))
+        self.assertEqual(
+            [c.root_id for c in (c1, c2, c3, c4)], [c1.pk] * 4
+        )
+        self.assertEqual([c.depth for c in (c1, c2, c3, c4)], [1, 2, 3, 2])
+        self.assertEqual((c1.leaf_id, c2.leaf_id), (c4.pk, c3.pk))
+        self.assertEqual(c1.digest, c1.make_digest())
+        # The assigned ids don't clash with new comments.
+        self.assertGreater(self.createComment(article).pk, c1.pk)
+
+    def testExistingParents(self):
+        article = Article.objects.get(pk=1)
+        parent = self.createComment(article)
+        later = self.createComment(article, parent=parent)
+        c1 = self.makeComment(
+            article, parent=parent,
+            submit_date=later.submit_date - timedelta(days=1)
+        )
+        c2 = self.makeComment(article)
+        c2.parent_id = parent.pk
+        Comment.objects.bulk_create_tree([c1, c2])
+        parent.refresh_from_db()
+        self.assertEqual(parent.leaf_id, c2.pk)
+        self.assertEqual(c1.path, '%s/%s' % (parent.path, encode_node(c1.pk)))
+        self.assertEqual(
+            Comment.objects.get(pk=c1.pk).submit_date,
+            later.submit_date - timedelta(days=1)
+        )
+
+    def testMissingParent(self):
+        article = Article.objects.get(pk=1)
+        c1 = self.makeComment(article)
+        c2 = self.makeComment(article, parent=Comment())
+        with self.assertRaises(ValueError):
+            Comment.objects.bulk_create_tree([c1, c2], batch_size=1)
+        self.assertFalse(Comment.objects.exists())
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_COUNTERS', True)
+    def testCounters(self):
+        article = Article.objects.get(pk=1)
+        Comment.objects.bulk_create_tree([
+            self.makeComment(article),
+            self.makeComment(article, is_public=False),
+            self.makeComment(article, is_removed=True),
+        ])
+        self.assertEqual(CommentCounter.objects.get().count, 1)
+
+
+class CommentBodyTests(CommentTestCase):
+
+    def setUp(self):
+        self.article = Article.objects.get(pk=1)
+
+    def testRenderOnSave(self):
+        c = self.createComment(self.article, body='<b>Hi</b>\n\nthere')
+        c = Comment.objects.get(pk=c.pk)
+        self.assertEqual(c.body_html, '<p>&lt;b&gt;Hi&lt;/b&gt;</p>\n\n<p>there</p>')
+        self.assertIsNone(c.body_text)
+        self.assertEqual(c.strip_body(), '<b>Hi</b>\n\nthere')
+
+    def testRenderOnEdit(self):
+        c = self.createComment(self.article, body='Hi')
+        c.body = 'Bye'
+        c.save(update_fields=['body'])
+        self.assertEqual(
+            Comment.objects.values_list('body_html', flat=True).get(pk=c.pk),
+            '<p>Bye</p>'
+        )
+
+    @mock.patch('commentary.abstracts.COMMENTS_ALLOW_HTML', True)
+    def testRenderHTML(self):
+        c = self.createComment(self.article, body='<b>Hi</b>\nthere')
+        c = Comment.objects.get(pk=c.pk)
+        self.assertEqual(c.body_html, '<p><b>Hi</b><br>there</p>')
+        self.assertEqual(c.body_text, 'Hi\nthere')
+        self.assertEqual(c.strip_body(), 'Hi\nthere')
+
+    def testRenderCommentBodies(self):
+        c1 = self.createComment(self.article, body='One')
+        c2 = self.createComment(self.article, body='Two')
+        Comment.objects.filter(pk=c1.pk).update(body_html=None)
+        Comment.objects.filter(pk=c2.pk).update(body_html='stale')
+        out = StringIO()
+        call_command('render_comment_bodies', '--missing', stdout=out)
+        self.assertEqual(out.getvalue(), 'Rendered 1 comments.\n')
+        self.assertEqual(
+            list(Comment.objects.values_list('body_html', flat=True)),
+            ['<p>One</p>', 'stale']
+        )
+        call_command('render_comment_bodies', batch_size=1, verbosity=0)
+        self.assertEqual(
+            list(Comment.objects.values_list('body_html', flat=True)),
+            ['<p>One</p>', '<p>Two</p>']
+        )
+
+
+class CommentStateTests(CommentTestCase):
+
+    def setUp(self):
+        article = Article.objects.get(pk=1)
+        self.parent = self.createComment(article)
+        self.comment = self.createComment(article, parent=self.parent)
+
+    def testMarkRemoved(self):
+        edit_date = self.comment.edit_date
+        with self.assertNumQueries(1) as ctx:
+            self.assertTrue(self.comment.mark_removed())
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"is_removed"', sql)
+        self.assertNotIn('"edit_date"', sql)
+        self.assertNotIn('"path"', sql)
+        c = Comment.objects.get(pk=self.comment.pk)
+        self.assertTrue(c.is_removed)
+        self.assertEqual(c.edit_date, edit_date)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.comment.mark_removed())
+
+    def testMarkApproved(self):
+        Comment.objects.filter(pk=self.comment.pk).update(is_public=False)
+        self.comment.is_public = False
+        with self.assertNumQueries(1) as ctx:
+            self.assertTrue(self.comment.mark_approved())
+        self.assertNotIn('"is_removed"', ctx.captured_queries[0]['sql'])
+        self.assertTrue(Comment.objects.get(pk=self.comment.pk).is_public)
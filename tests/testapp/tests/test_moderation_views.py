@@ -1,10 +1,20 @@
+from unittest import mock
+
 from django.contrib.auth.models import User, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import QuerySet
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from django.utils import translation
 
+import commentary
 from commentary import signals
-from commentary.models import Comment, CommentFlag
+from commentary.models import Comment, CommentCounter, CommentFlag
+from commentary.views.moderation import (
+    perform_bulk_approve, perform_bulk_delete, perform_bulk_flag
+)
+
+from testapp.models import Article
 
 from . import CommentTestCase
 
@@ -333,3 +343,86 @@ class AdminActionsTests(CommentTestCase):
                 '1 comment was successfully removed.')
             self.performActionAndCheckMessage('remove_comments', many_comments,
                 '3 comments were successfully removed.')
+
+    def testChangelistUserDisplays(self):
+        user = User.objects.get(username="normaluser")
+        article = Article.objects.get(pk=1)
+        c1 = self.createComment(article, user=user)
+        self.createComment(article, parent=c1, user=user)
+        self.client.login(username="normaluser", password="normaluser")
+        with mock.patch.object(
+            commentary, 'get_user_displays',
+            return_value={user.pk: 'Normal User'}
+        ) as get_user_displays:
+            response = self.client.get("/admin/commentary/comment/")
+        get_user_displays.assert_called_once()
+        self.assertContains(response, 'Normal User')
+        self.assertIsInstance(response.context['cl'].result_list, QuerySet)
+
+
+class BulkModerationTests(CommentTestCase):
+
+    def setUp(self):
+        self.article = Article.objects.get(pk=1)
+        self.user = User.objects.get(username="normaluser")
+        self.request = RequestFactory().post('/')
+        self.request.user = self.user
+        self.comments = [
+            self.createComment(self.article, user=self.user)
+            for _ in range(3)
+        ]
+        self.comments[2].is_public = False
+        self.comments[2].save()
+        self.received = []
+        signals.comments_were_flagged.connect(self.receive)
+
+    def tearDown(self):
+        signals.comments_were_flagged.disconnect(self.receive)
+
+    def receive(self, sender, **kwargs):
+        self.received.append(kwargs)
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_COUNTERS', True)
+    def testBulkDelete(self):
+        CommentCounter.objects.rebuild(Comment.objects.all())
+        with self.assertNumQueries(7):
+            n = perform_bulk_delete(self.request, Comment.objects.all())
+        self.assertEqual(n, 3)
+        self.assertEqual(Comment.objects.filter(is_removed=True).count(), 3)
+        self.assertEqual(CommentFlag.objects.filter(
+            flag=CommentFlag.MODERATOR_DELETION
+        ).count(), 3)
+        self.assertEqual(CommentCounter.objects.get().count, 0)
+        self.assertEqual(len(self.received), 1)
+        self.assertCountEqual(
+            self.received[0]['comment_ids'], [c.pk for c in self.comments]
+        )
+        self.assertEqual(
+            self.received[0]['flag'], CommentFlag.MODERATOR_DELETION
+        )
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_COUNTERS', True)
+    def testBulkApprove(self):
+        perform_bulk_approve(self.request, Comment.objects.all())
+        self.assertEqual(Comment.objects.filter(is_public=True).count(), 3)
+        self.assertEqual(CommentCounter.objects.get().count, 3)
+
+    def testBulkFlagTwice(self):
+        perform_bulk_flag(self.request, Comment.objects.all())
+        perform_bulk_flag(self.request, Comment.objects.all())
+        self.assertEqual(CommentFlag.objects.count(), 3)
+        self.assertEqual(len(self.received), 2)
+
+    def testQueriesDoNotGrow(self):
+        for _ in range(10):
+            self.createComment(self.article, user=self.user)
+        with self.assertNumQueries(4):
+            perform_bulk_flag(self.request, Comment.objects.all())
+
+    @mock.patch.object(commentary, 'COMMENTS_CACHE', 'default')
+    def testInvalidatesCachedLists(self):
+        with mock.patch('commentary.cache.bump_list_version') as bump:
+            perform_bulk_delete(self.request, Comment.objects.all())
+        bump.assert_called_once_with(
+            self.comments[0].content_type_id, '1', self.comments[0].site_id
+        )
@@ -0,0 +1,156 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.template import Context, Template
+from django.test.utils import override_settings
+
+import commentary
+from commentary.models import Comment
+
+from testapp.models import Article
+from . import CommentTestCase
+from .test_moderation_views import makeModerator
+
+
+class QueryBudgetTests(CommentTestCase):
+    """
+    Each entry point is run on a thread of growing size and has to stay
+    within its query budget, which must not depend on the size.
+    """
+    sizes = (1, 4, 16)
+
+    def setUp(self):
+        super(QueryBudgetTests, self).setUp()
+        self.article = Article.objects.get(pk=1)
+        self.count = 0
+
+    def addComments(self, number):
+        """Add comments by new users, every other one being a reply."""
+        parent = None
+        for n in range(self.count, self.count + number):
+            user = User.objects.create(username='user%d' % n)
+            comment = self.createComment(
+                self.article, body='Comment #%d' % n,
+                parent=parent, user=user
+            )
+            parent = None if parent else comment
+        self.count += number
+
+    def assertQueryBudget(self, budget, run, setup=None):
+        """
+        Assert that ``run`` makes ``budget`` queries on threads of each
+        size. ``setup`` can return the arguments of ``run``, so that it
+        isn't counted.
+        """
+        for size in self.sizes:
+            self.addComments(size - self.count)
+            args = setup() if setup else ()
+            with self.subTest(comments=size), self.assertNumQueries(budget):
+                run(*args)
+
+    def assertTagBudget(self, budget, template):
+        template = Template('{% load comments %}' + template)
+        self.assertQueryBudget(budget, lambda: template.render(
+            Context({'a': self.article, 'articles': [self.article]})
+        ))
+
+    def testGetCommentCount(self):
+        self.assertTagBudget(
+            1, '{% get_comment_count for a as n %}{{ n }}'
+        )
+
+    def testGetCommentCounts(self):
+        self.assertTagBudget(
+            1, '{% get_comment_counts for articles as counts %}'
+            '{% for obj, n in counts %}{{ obj }}: {{ n }}{% endfor %}'
+        )
+
+    def testGetCommentList(self):
+        self.assertTagBudget(
+            1, '{% get_comment_list for a as comments %}'
+            '{% for c in comments %}{{ c.user_display }}{{ c.user }}'
+            '{{ c|safe_comment }}{% endfor %}'
+        )
+
+    def testGetCommentListPage(self):
+        self.assertTagBudget(
+            1, '{% get_comment_list for a as comments page_size 5 %}'
+            '{% for c in comments %}{{ c.user_display }}{% endfor %}'
+        )
+
+    def testGetCommentTree(self):
+        self.assertTagBudget(
+            1, '{% get_comment_tree for a as tree %}{% for node in tree %}'
+            '{{ node.comment.user_display }}{% for reply in node.replies %}'
+            '{{ reply.comment.user_display }}{% endfor %}{% endfor %}'
+        )
+
+    def testRenderCommentList(self):
+        self.assertTagBudget(1, '{% render_comment_list for a %}')
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_ROWS', True)
+    def testRenderCommentListRows(self):
+        self.assertTagBudget(2, '{% render_comment_list for a %}')
+
+    def testRenderCommentForm(self):
+        self.assertTagBudget(0, '{% render_comment_form for a %}')
+
+    def testCountForObjects(self):
+        self.assertQueryBudget(
+            1, lambda: Comment.objects.count_for_objects([self.article])
+        )
+
+    def testRows(self):
+        def rows():
+            for row in Comment.objects.rows(Comment.objects.for_model(
+                self.article
+            )):
+                row.user_display, row.user.username
+        self.assertQueryBudget(2, rows)
+
+    def testPostComment(self):
+        self.client.force_login(User.objects.get(username='normaluser'))
+        data = self.getValidData(self.article)
+
+        def post():
+            data['comment'] = 'Posted after %d comments' % self.count
+            response = self.client.post('/post/', data)
+            self.assertEqual(response.status_code, 302)
+        self.assertQueryBudget(6, post)
+
+    def assertModerationBudget(self, budget, view):
+        makeModerator('normaluser')
+        self.client.force_login(User.objects.get(username='normaluser'))
+
+        def moderate(pk):
+            response = self.client.post('/%s/%d/' % (view, pk))
+            self.assertEqual(response.status_code, 302)
+        self.assertQueryBudget(
+            budget, moderate, lambda: (Comment.objects.latest('pk').pk,)
+        )
+
+    def testFlag(self):
+        self.assertModerationBudget(7, 'flag')
+
+    def testDelete(self):
+        self.assertModerationBudget(10, 'delete')
+
+    def testApprove(self):
+        self.assertModerationBudget(9, 'approve')
+
+    @override_settings(ROOT_URLCONF='testapp.urls')
+    def testFeed(self):
+        def get_feed():
+            response = self.client.get('/rss/comments/')
+            self.assertContains(response, 'Comment #0')
+        self.assertQueryBudget(1, get_feed)
+
+    @override_settings(ROOT_URLCONF='testapp.urls_admin')
+    def testAdminChangelist(self):
+        User.objects.create_superuser('su', 'su@example.com', 'su')
+        self.client.force_login(User.objects.get(username='su'))
+
+        def get_changelist():
+            response = self.client.get('/admin/commentary/comment/')
+            self.assertContains(response, 'user%d' % (self.count - 1))
+        self.assertQueryBudget(9, get_changelist)
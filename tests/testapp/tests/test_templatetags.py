@@ -1,12 +1,23 @@
+from base64 import urlsafe_b64encode
+from unittest import mock
+
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.template import Template, Context
+from django.db.models import QuerySet
+from django.template import Template, TemplateSyntaxError, Context
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
+import commentary
+from commentary import signals
 from commentary.forms import CommentForm
 from commentary.models import Comment
+from commentary.pagination import decode_cursor, encode_cursor, get_page
+from commentary.rows import CommentRow
+from commentary.templatetags.comments import build_comment_tree
 
 from testapp.models import Article, Author
 from . import CommentTestCase
@@ -216,3 +227,311 @@ class CommentTemplateTagTests(CommentTestCase):
 
         with self.assertNumQueries(2):
             self.verifyGetCommentCount()
+
+
+class CommentTreeTagTests(CommentTestCase):
+
+    def testGetCommentTree(self):
+        a = Article.objects.get(pk=1)
+        c1 = self.createComment(a)
+        c2 = self.createComment(a, parent=c1)
+        c3 = self.createComment(a, parent=c2)
+        c4 = self.createComment(a)
+        t = "{% load comments %}{% get_comment_tree for a as tree %}"
+        with self.assertNumQueries(1):
+            ctx = Context({'a': a})
+            Template(t).render(ctx)
+        tree = ctx['tree']
+        self.assertEqual([n.comment for n in tree], [c1, c4])
+        self.assertEqual([n.comment for n in tree[0].replies], [c2])
+        self.assertEqual([n.comment for n in tree[0].replies[0].replies], [c3])
+        self.assertEqual(tree[1].replies, [])
+
+    def testBuildCommentTreeOrphans(self):
+        a = Article.objects.get(pk=1)
+        c1 = self.createComment(a)
+        c2 = self.createComment(a, parent=c1)
+        tree = build_comment_tree([c2])
+        self.assertEqual([n.comment for n in tree], [c2])
+
+
+class CommentCountsTagTests(CommentTestCase):
+
+    def setUp(self):
+        self.a1, self.a2 = Article.objects.all()
+        self.createComment(self.a1)
+        self.createComment(self.a1)
+        self.createComment(self.a1, is_public=False)
+        self.createComment(self.a1, is_removed=True)
+
+    def testGetCommentCounts(self):
+        t = "{% load comments %}{% get_comment_counts for articles as counts %}"
+        t += "{% for a, count in counts %}{{ a.pk }}:{{ count }} {% endfor %}"
+        with self.assertNumQueries(1):
+            out = Template(t).render(Context({'articles': [self.a1, self.a2]}))
+        self.assertEqual(out, "1:2 2:0 ")
+
+    def testGetCommentCountsFromLiteral(self):
+        t = "{% load comments %}{% get_comment_counts for testapp.article pks as counts %}"
+        t += "{% for pk, count in counts %}{{ pk }}:{{ count }} {% endfor %}"
+        out = Template(t).render(Context({'pks': [2, 1]}))
+        self.assertEqual(out, "2:0 1:2 ")
+
+    def testCountForObjects(self):
+        counts = Comment.objects.count_for_objects([self.a1, self.a2])
+        self.assertEqual(counts, {1: 4, 2: 0})
+        counts = Comment.objects.count_for_objects(
+            [self.a1, self.a2], is_public=True
+        )
+        self.assertEqual(counts, {1: 3, 2: 0})
+
+
+class CommentListCacheTests(CommentTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(commentary, 'COMMENTS_CACHE', 'default')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches['default'].clear()
+        self.article = Article.objects.get(pk=1)
+        self.user = User.objects.get(username='normaluser')
+
+    def render(self):
+        t = "{% load comments %}{% render_comment_list for a %}"
+        return Template(t).render(Context({'a': self.article}))
+
+    def testCachedList(self):
+        comment = self.createComment(self.article, body='First', user=self.user)
+        out = self.render()
+        self.assertIn('First', out)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), out)
+        # comments changed without signals are not noticed
+        Comment.objects.update(body='Changed')
+        self.assertEqual(self.render(), out)
+        comment.body = 'Edited'
+        comment.save()
+        self.assertIn('Edited', self.render())
+
+    def testInvalidation(self):
+        comment = self.createComment(self.article, body='First', user=self.user)
+        self.render()
+        self.createComment(self.article, body='Second', user=self.user)
+        self.assertIn('Second', self.render())
+        signals.comment_was_flagged.send(
+            sender=Comment, comment=comment, flag=None,
+            created=True, request=None
+        )
+        Comment.objects.filter(pk=comment.pk).update(
+            body='Flagged', body_html='<p>Flagged</p>'
+        )
+        self.assertIn('Flagged', self.render())
+        Comment.objects.get(pk=comment.pk).delete()
+        self.assertNotIn('Flagged', self.render())
+
+
+class CommentListPaginationTests(CommentTestCase):
+
+    def setUp(self):
+        self.article = Article.objects.get(pk=1)
+        self.comments = [self.createComment(self.article) for _ in range(3)]
+        self.comments.insert(1, self.createComment(
+            self.article, parent=self.comments[0]
+        ))
+
+    def render(self, t, **c):
+        ctx = Context(dict(c, a=self.article))
+        Template("{% load comments %}" + t).render(ctx)
+        return ctx
+
+    def testPages(self):
+        t = "{% get_comment_list for a as cl page_size 3 after cursor %}"
+        ctx = self.render(t, cursor=None)
+        self.assertEqual(list(ctx['cl']), self.comments[:3])
+        self.assertTrue(ctx['cl'].has_next)
+        with self.assertNumQueries(1):
+            ctx = self.render(t, cursor=ctx['cl'].next_cursor)
+        self.assertEqual(list(ctx['cl']), self.comments[3:])
+        self.assertIsNone(ctx['cl'].next_cursor)
+
+    def testPageSizeOnly(self):
+        ctx = self.render("{% get_comment_list for testapp.article a.pk as cl page_size 2 %}")
+        self.assertEqual(list(ctx['cl']), self.comments[:2])
+
+    def testInvalidCursor(self):
+        t = "{% get_comment_list for a as cl page_size 2 after 'garbage' %}"
+        self.assertEqual(list(self.render(t)['cl']), self.comments[:2])
+
+    def testCursorRoundTrip(self):
+        cursor = encode_cursor(self.comments[1])
+        self.assertEqual(decode_cursor(cursor), [self.comments[1].path])
+        page = get_page(Comment.objects.all(), 10, cursor)
+        self.assertEqual(list(page), self.comments[2:])
+
+    def testAfterWithoutPageSize(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render("{% get_comment_list for a as cl after cursor %}")
+
+    def testInvalidPageSize(self):
+        t = "{% get_comment_list for a as cl page_size size %}"
+        for size in (0, -1, None, 'x'):
+            with self.subTest(size=size):
+                with self.assertRaises(TemplateSyntaxError):
+                    self.render(t, size=size)
+        with self.assertRaises(ValueError):
+            get_page(Comment.objects.all(), 0)
+
+    def testInvalidCursorValues(self):
+        cursor = urlsafe_b64encode(b'[1]').decode()
+        with self.assertRaises(ValueError):
+            get_page(Comment.objects.all(), 2, cursor)
+        t = "{% get_comment_list for a as cl page_size 2 after cursor %}"
+        self.assertEqual(
+            list(self.render(t, cursor=cursor)['cl']), self.comments[:2]
+        )
+
+
+class CommentRowsTests(CommentTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(commentary, 'COMMENTS_USE_ROWS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.article = Article.objects.get(pk=1)
+        self.user = User.objects.get(username='normaluser')
+        self.c1 = self.createComment(self.article, body='One', user=self.user)
+        self.c2 = self.createComment(self.article, body='Two', parent=self.c1)
+
+    def testRows(self):
+        with self.assertNumQueries(2):
+            rows = Comment.objects.rows()
+        self.assertEqual([r.pk for r in rows], [self.c1.pk, self.c2.pk])
+        self.assertIsInstance(rows[0], CommentRow)
+        self.assertEqual(rows[0].user_display, self.c1.user_display)
+        self.assertEqual(rows[1].user_display, '')
+        # Only the fields of the user's name are fetched.
+        self.assertIn('password', rows[0].user.get_deferred_fields())
+        self.assertEqual(rows[0].get_absolute_url(), self.c1.get_absolute_url())
+        self.assertFalse(hasattr(rows[0], '__dict__'))
+
+    @override_settings(COMMENTS_APP='custom_comments')
+    def testRowsWithCustomUserDisplays(self):
+        # The users are fetched in full for the fields the hooks may read.
+        with self.assertNumQueries(2):
+            rows = Comment.objects.rows()
+            self.assertEqual(
+                [r.user_display for r in rows],
+                ['Custom normaluser', 'Custom anonymous']
+            )
+        self.assertEqual(rows[0].user.get_deferred_fields(), set())
+
+    def testRenderCommentList(self):
+        t = "{% load comments %}{% render_comment_list for a %}"
+        with self.assertNumQueries(2):
+            out = Template(t).render(Context({'a': self.article}))
+        self.assertIn('One', out)
+        self.assertIn(self.c1.user_display, out)
+
+    def testPaginatedRows(self):
+        t = "{% load comments %}{% get_comment_list for a as cl page_size 1 %}"
+        ctx = Context({'a': self.article})
+        Template(t).render(ctx)
+        self.assertEqual(list(ctx['cl']), [CommentRow(**{
+            f: getattr(self.c1, f) for f in CommentRow.fields
+        })])
+        self.assertEqual(decode_cursor(ctx['cl'].next_cursor), [self.c1.path])
+
+
+class CommentUserDisplaysTests(CommentTestCase):
+
+    def setUp(self):
+        self.article = Article.objects.get(pk=1)
+        self.user = User.objects.get(username='normaluser')
+        self.other = User.objects.create_user('otheruser')
+        c1 = self.createComment(self.article, body='One', user=self.user)
+        self.createComment(self.article, body='Two', user=self.other)
+        self.createComment(self.article, body='Three', parent=c1)
+        self.createComment(self.article, body='Four', user=self.user)
+
+    def displays(self, users):
+        return {u.pk: u.get_username().upper() for u in users}
+
+    def render(self, num_queries):
+        t = "{% load comments %}{% render_comment_list for a %}"
+        with mock.patch.object(
+            commentary, 'get_user_displays', side_effect=self.displays
+        ) as get_user_displays, self.assertNumQueries(num_queries):
+            out = Template(t).render(Context({'a': self.article}))
+        get_user_displays.assert_called_once()
+        users = get_user_displays.call_args[0][0]
+        self.assertCountEqual(users, [self.user, self.other])
+        return out
+
+    def testRenderCommentList(self):
+        out = self.render(1)
+        self.assertIn('NORMALUSER', out)
+        self.assertIn('OTHERUSER', out)
+
+    @mock.patch.object(commentary, 'COMMENTS_USE_ROWS', True)
+    def testRenderCommentListRows(self):
+        out = self.render(2)
+        self.assertIn('NORMALUSER', out)
+
+    def testGetCommentList(self):
+        t = "{% load comments %}{% get_comment_list for a as cl %}"
+        ctx = Context({'a': self.article})
+        with self.assertNumQueries(0):
+            Template(t).render(ctx)
+        self.assertIsInstance(ctx['cl'], QuerySet)
+        self.assertEqual(ctx['cl'].filter(user=self.other).count(), 1)
+        with mock.patch.object(
+            commentary, 'get_user_displays', side_effect=self.displays
+        ) as get_user_displays, self.assertNumQueries(1):
+            displays = [c.user_display for c in ctx['cl']]
+        get_user_displays.assert_called_once()
+        self.assertEqual(
+            displays, ['NORMALUSER', '', 'OTHERUSER', 'NORMALUSER']
+        )
+
+    def testGetCommentTree(self):
+        t = "{% load comments %}{% get_comment_tree for a as tree %}"
+        ctx = Context({'a': self.article})
+        with mock.patch.object(
+            commentary, 'get_user_displays', side_effect=self.displays
+        ) as get_user_displays:
+            Template(t).render(ctx)
+        get_user_displays.assert_called_once()
+        self.assertEqual(
+            [n.comment.user_display for n in ctx['tree']],
+            ['NORMALUSER', 'OTHERUSER', 'NORMALUSER']
+        )
+        self.assertEqual(ctx['tree'][0].replies[0].comment.user_display, '')
+
+
+class SafeCommentFilterTests(CommentTestCase):
+
+    def render(self, **kwargs):
+        t = "{% load comments %}{{ c|safe_comment }}"
+        return Template(t).render(Context(kwargs))
+
+    def testStoredBody(self):
+        c = self.createComment(Article.objects.get(pk=1), body='<i>Hi</i>')
+        c = Comment.objects.get(pk=c.pk)
+        c.body = 'Ignored'
+        self.assertEqual(self.render(c=c), '<p>&lt;i&gt;Hi&lt;/i&gt;</p>')
+
+    def testStoredBodyOfAnotherMode(self):
+        c = self.createComment(Article.objects.get(pk=1), body='<i>Hi</i>')
+        # Rendered while HTML was allowed, and served after disallowing it.
+        Comment.objects.filter(pk=c.pk).update(
+            body_html='<p><i>Hi</i></p>', body_text='Hi'
+        )
+        c = Comment.objects.get(pk=c.pk)
+        self.assertEqual(self.render(c=c), '<p>&lt;i&gt;Hi&lt;/i&gt;</p>')
+        row = Comment.objects.rows()[0]
+        self.assertEqual(self.render(c=row), '<p>&lt;i&gt;Hi&lt;/i&gt;</p>')
+
+    def testBody(self):
+        self.assertEqual(self.render(c='<i>Hi</i>'), '<p>&lt;i&gt;Hi&lt;/i&gt;</p>')
+        with mock.patch.object(commentary, 'COMMENTS_ALLOW_HTML', True):
+            self.assertEqual(self.render(c='<i>Hi</i>'), '<p><i>Hi</i></p>')